@@ -1,18 +1,45 @@
+import asyncio
+import math
+import time
+from typing import Optional
+
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request, Response, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from control import RobotAPI
-from config import HOST_ROBOT
+from batch import BatchError, BatchRunner
+from conditions import ConditionError, compile_condition
+from control import AsyncRobotAPI, RobotAPI
+from devices import DeviceError
+from config import HISTORY_CAPACITY, HOST_ROBOT, TRACE_SAMPLE_RATE
+from history import HistoryError, RegisterHistory
+from json_codec import CodecJSONResponse
+from metrics import CONTENT_TYPE, REGISTRY
+from mission import MissionEngine
+from navqueue import NavQueue, NavQueueError
+from sensors import SensorFilter
+from status_stream import StatusStream
+from tracing import TracedRoute, Tracer, TracingMiddleware
+from waiting import wait_until
 
 control = RobotAPI(HOST_ROBOT)
+robot = AsyncRobotAPI(control)
+status_stream = StatusStream(control.snapshots)
+batch_runner = BatchRunner(control, robot)
+missions = MissionEngine(control, robot, batch_runner)
+nav_queue = NavQueue(control, robot)
+tracer = Tracer(TRACE_SAMPLE_RATE)
+register_history = RegisterHistory(HISTORY_CAPACITY)
 
 app = FastAPI(
     title="AMR API",
     openapi_url="/openapi.json",
     docs_url="/docs",
     description="AMR API documentation",
+    default_response_class=CodecJSONResponse,
 )
+# route khai báo sau dòng này có span "route"/"handler" khi request được trace
+app.router.route_class = TracedRoute
 
 app.add_middleware(
     CORSMiddleware,
@@ -21,34 +48,49 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(TracingMiddleware, tracer=tracer)
 
 
 @app.post("/navigation")
 async def navigate(content: dict):
-    control.navigation(content)
+    await robot.navigation(content)
     return {"message": "Robot đã nhận thông tin điểm tới"}
 
 
 @app.get("/action")
 async def navigate_action(type: str):
     if type == "pause":
-        control.nav_pause()
+        await robot.nav_pause()
     elif type == "resume":
-        control.nav_resume()
+        await robot.nav_resume()
     elif type == "cancel":
-        control.nav_cancel()
+        await robot.nav_cancel()
     return {"message": f"Robot đã nhận lệnh {type} di chuyển"}
 
 
 @app.get("/status")
-def get_status():
-    return control.data_status
+async def get_status(request: Request, since: Optional[int] = None, timeout: float = 0.0):
+    snapshot = control.snapshots.current()
+    # since lớn hơn version hiện tại (server khởi động lại, version đếm lại từ
+    # đầu): trả snapshot hiện tại ngay thay vì chờ rồi 304
+    if since is not None and timeout > 0 and snapshot.version == since:
+        snapshot = await control.snapshots.wait_async(since, min(timeout, 60.0))
+    headers = {"ETag": snapshot.etag, "X-Status-Version": str(snapshot.version)}
+    if request.headers.get("if-none-match") == snapshot.etag or snapshot.version == since:
+        return Response(status_code=304, headers=headers)
+    return Response(snapshot.body, media_type="application/json", headers=headers)
+
+
+@app.websocket("/ws/status")
+async def ws_status(websocket: WebSocket):
+    await websocket.accept()
+    await status_stream.serve(websocket)
 
 
 @app.post("/relocation")
 async def relocation(content: dict):
     try:
-        control.relocation(content["data"])
+        await robot.relocation(content["data"])
         return {"message": "Gửi lệnh lấy lại vị trí cho robot thành công"}
     except Exception as e:
         return {"message": f"Có lỗi xảy ra khi gửi lệnh lấy lại vị trí cho robot {e}"}
@@ -56,7 +98,7 @@ async def relocation(content: dict):
 
 @app.post("/confirm")
 async def confirm():
-    control.confirm_local()
+    await robot.confirm_local()
     return {"message": "Gửi lệnh xác nhận vị trí cho robot thành công"}
 
 
@@ -88,6 +130,97 @@ async def check_stopper(content: dict):
     return control.check_stopper(content["status"], content["action"])
 
 
+@app.get("/registers")
+def registers():
+    return control.registers.current().as_dict()
+
+
+@app.get("/devices")
+def devices():
+    return [device.layout.as_dict() for device in control.devices.values()]
+
+
+@app.get("/devices/registers")
+def devices_registers():
+    return control.read_devices()
+
+
+@app.get("/devices/{name}/registers")
+def device_registers(name: str):
+    try:
+        return control.device(name).snapshot().as_dict()
+    except DeviceError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@app.put("/devices/outputs")
+def write_device_outputs(content: dict):
+    """Ghi output nhiều thiết bị một lượt: {"io2": {"3": 1, "led": 2}, ...}."""
+    for name, writes in content.items():
+        if not isinstance(writes, dict):
+            raise HTTPException(status_code=400, detail=f"{name}: cần object {{field hoặc địa chỉ: giá trị}}")
+    try:
+        runs = control.write_devices(content)
+    except DeviceError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        name: [{"address": address, "values": values} for address, values in device_runs]
+        for name, device_runs in runs.items()
+    }
+
+
+@app.get("/sensors")
+def sensors(edges: int = 50):
+    """
+    Cảm biến sau bộ lọc: giá trị thô/ổn định, thời điểm cạnh gần nhất theo kênh và các cạnh gần đây.
+
+    /status giữ "sensor" là giá trị thanh ghi thô của kênh 5, 6; giá trị đã lọc
+    (0/1) nằm ở "sensor_stable", thời điểm đổi ở "sensor_edge_ms".
+    """
+    return control.sensors.as_dict(edges)
+
+
+@app.put("/sensors/filter")
+def set_sensor_filter(content: dict):
+    current = control.sensors.filter
+    try:
+        sensor_filter = SensorFilter(
+            kind=content.get("kind", current.kind),
+            window=int(content.get("window", current.window)),
+            high=float(content.get("high", current.high)),
+            low=float(content.get("low", current.low)),
+        )
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    control.sensors.configure(sensor_filter)
+    return control.sensors.as_dict(0)["filter"]
+
+
+@app.get("/history/registers")
+def history_registers(
+    kind: str = "hr",
+    address: int = 0,
+    count: Optional[int] = None,
+    start_ms: Optional[int] = None,
+    end_ms: Optional[int] = None,
+    at_ms: Optional[int] = None,
+    max_edges: int = 1000,
+):
+    """Lịch sử thanh ghi: mặc định 60 s gần nhất của cả block holding."""
+    if end_ms is None:
+        end_ms = int(time.time() * 1000)
+    if start_ms is None:
+        start_ms = end_ms - 60_000
+    try:
+        result = register_history.query(
+            start_ms, end_ms, kind=kind, address=address, count=count, at_ms=at_ms, max_edges=max_edges
+        )
+    except HistoryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    result["retention"] = register_history.info()
+    return result
+
+
 @app.get("/checklocation")
 async def check_location(content: dict):
     return control.check_robot_location(content["location"])
@@ -109,10 +242,212 @@ def sensor():
 
 
 @app.post("/monitor")
-def monitor(content: dict):
-    return control.monitor(content)
+async def monitor(content: dict):
+    return await robot.monitor(content)
 
 
 @app.post("/emergency")
 def emergency(content: dict):
     return control.change_emergency(content["status"])
+
+
+@app.post("/batch")
+async def batch(content: dict):
+    try:
+        return await batch_runner.run(content.get("ops"), content.get("stop_on_error", True))
+    except BatchError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post("/missions")
+async def start_mission(content: dict):
+    try:
+        mission = missions.start(content["steps"])
+    except BatchError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if content.get("wait"):
+        try:
+            await asyncio.shield(mission.task)
+        except asyncio.CancelledError:
+            pass
+    return mission.as_dict()
+
+
+@app.get("/missions/{mission_id}")
+async def get_mission(mission_id: str, since: Optional[int] = None, timeout: float = 0.0):
+    mission = missions.get(mission_id)
+    if mission is None:
+        raise HTTPException(status_code=404, detail="Không tìm thấy mission")
+    if since is not None and timeout > 0:
+        await missions.wait_change(mission, since, min(timeout, 60.0))
+    return mission.as_dict()
+
+
+@app.delete("/missions/{mission_id}")
+async def cancel_mission(mission_id: str):
+    mission = await missions.cancel(mission_id)
+    if mission is None:
+        raise HTTPException(status_code=404, detail="Không tìm thấy mission")
+    return mission.as_dict()
+
+
+@app.get("/navqueue")
+def get_nav_queue():
+    return nav_queue.state()
+
+
+@app.post("/navqueue")
+async def append_nav_queue(content: dict):
+    try:
+        await nav_queue.append(content.get("targets"))
+    except NavQueueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return nav_queue.state()
+
+
+@app.put("/navqueue")
+async def reorder_nav_queue(content: dict):
+    try:
+        await nav_queue.reorder(content.get("legs") or [])
+    except NavQueueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return nav_queue.state()
+
+
+@app.delete("/navqueue")
+async def clear_nav_queue():
+    try:
+        await nav_queue.cancel()
+    except NavQueueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return nav_queue.state()
+
+
+@app.delete("/navqueue/{leg_id}")
+async def cancel_nav_leg(leg_id: str):
+    try:
+        await nav_queue.cancel(leg_id)
+    except NavQueueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return nav_queue.state()
+
+
+def _pose(x: Optional[float], y: Optional[float]):
+    if x is not None and y is not None:
+        if not (math.isfinite(x) and math.isfinite(y)):
+            raise HTTPException(status_code=400, detail="x, y phải là số hữu hạn")
+        return x, y
+    data = control.data_status or {}
+    if data.get("x") is None or data.get("y") is None:
+        raise HTTPException(status_code=503, detail="Chưa có vị trí robot")
+    return data["x"], data["y"]
+
+
+async def _station_index():
+    if not control.stations.loaded:
+        await asyncio.to_thread(control.stations.ensure_loaded)
+    return control.stations.index
+
+
+@app.get("/stations")
+async def stations_info():
+    await _station_index()
+    return control.stations.info()
+
+
+@app.get("/stations/nearest")
+async def nearest_station(x: Optional[float] = None, y: Optional[float] = None):
+    pose = _pose(x, y)
+    index = await _station_index()
+    found = index.nearest(*pose)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Bản đồ không có trạm")
+    station, distance = found
+    return {"station": station.as_dict(), "distance": distance}
+
+
+@app.get("/stations/within")
+async def stations_within(radius: float, x: Optional[float] = None, y: Optional[float] = None):
+    if not math.isfinite(radius):
+        raise HTTPException(status_code=400, detail="radius phải là số hữu hạn")
+    pose = _pose(x, y)
+    index = await _station_index()
+    return [
+        {"station": station.as_dict(), "distance": distance}
+        for station, distance in index.within(*pose, radius)
+    ]
+
+
+@app.get("/stations/{station_id}/distance")
+async def station_distance(station_id: str, x: Optional[float] = None, y: Optional[float] = None):
+    pose = _pose(x, y)
+    index = await _station_index()
+    distance = index.distance(*pose, station_id)
+    if distance is None:
+        raise HTTPException(status_code=404, detail="Không tìm thấy trạm")
+    return {"station": station_id, "distance": distance}
+
+
+@app.post("/wait")
+async def wait_condition(content: dict):
+    try:
+        predicate, registers = compile_condition(content.get("condition"), control)
+        timeout = min(float(content.get("timeout", 10.0)), 60.0)
+    except (ConditionError, TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    started = asyncio.get_running_loop().time()
+    try:
+        result = await wait_until(
+            control.snapshots,
+            predicate,
+            timeout,
+            registers=control.registers.notifier if registers else None,
+        )
+    except ConditionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "result": result,
+        "elapsed_ms": (asyncio.get_running_loop().time() - started) * 1000,
+        "version": control.snapshots.current().version,
+    }
+
+
+@app.get("/metrics")
+def metrics():
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
+@app.get("/debug/traces")
+def debug_traces(limit: int = 50, min_ms: float = 0.0, name: str = ""):
+    return {
+        "sample_rate": tracer.sample_rate,
+        "sampled": tracer.sampled,
+        "traces": tracer.query(limit, min_ms, name),
+    }
+
+
+@app.put("/debug/traces")
+def set_trace_rate(content: dict):
+    try:
+        rate = float(content["sample_rate"])
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Cần sample_rate trong khoảng 0..1")
+    tracer.sample_rate = min(max(rate, 0.0), 1.0)
+    return {"sample_rate": tracer.sample_rate}
+
+
+@app.get("/connection")
+def connection():
+    return control.connection.status()
+
+
+@app.get("/scheduler")
+def scheduler():
+    return {
+        channel.port: channel.lane_stats()
+        for channel in (
+            control.api_robot_status,
+            control.api_robot_control,
+            control.api_robot_navigation,
+        )
+    }
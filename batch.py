@@ -0,0 +1,170 @@
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from control import AsyncRobotAPI, OutputRegister, RobotAPI
+
+JsonDict = Dict[str, Any]
+
+
+class BatchError(Exception):
+    pass
+
+
+class BatchRunner:
+    """
+    Chạy một chuỗi thao tác trong một request HTTP (POST /batch).
+
+    Mỗi bước có dạng {"op": <tên>, ...tham số như endpoint tương ứng}. Các
+    bước ghi thanh ghi output liên tiếp (lift, stopper, conveyor, color) được
+    gom lại và ghi một lần, các địa chỉ liền nhau dùng chung một setValues;
+    phần gom được ghi ra trước bước đọc/lệnh robot kế tiếp hoặc khi hết batch.
+    """
+
+    def __init__(self, robot: RobotAPI, async_robot: AsyncRobotAPI) -> None:
+        self.robot = robot
+        self.async_robot = async_robot
+        self.writes: Dict[str, Callable[[JsonDict], Tuple[int, int]]] = {
+            "lift": self._lift,
+            "stopper": self._stopper,
+            "conveyor": self._conveyor,
+            "color": self._color,
+        }
+        self.calls: Dict[str, Callable[[JsonDict], Awaitable[Any]]] = {
+            "check_conveyor": self._sync(lambda s: robot.check_conveyor(s["type"])),
+            "check_stopper": self._sync(lambda s: robot.check_stopper(s["status"], s["action"])),
+            "check_lift": self._sync(lambda s: robot.check_conveyor_height(s["height"])),
+            "check_location": self._sync(lambda s: robot.check_robot_location(s["location"])),
+            "sensor": self._sync(lambda s: robot.check_sensor()),
+            "emergency": self._sync(lambda s: robot.change_emergency(s["status"])),
+            "navigation": self._robot(lambda s: async_robot.navigation(s["data"])),
+            "action": self._robot(self._action),
+            "relocation": self._robot(lambda s: async_robot.relocation(s["data"])),
+            "confirm": self._robot(lambda s: async_robot.confirm_local()),
+            "monitor": self._robot(lambda s: async_robot.monitor(s["data"])),
+        }
+
+    @staticmethod
+    def _sync(fn: Callable[[JsonDict], Any]) -> Callable[[JsonDict], Awaitable[Any]]:
+        async def _call(step: JsonDict) -> Any:
+            return fn(step)
+
+        return _call
+
+    @staticmethod
+    def _robot(fn: Callable[[JsonDict], Awaitable[Any]]) -> Callable[[JsonDict], Awaitable[Any]]:
+        """Lệnh gửi robot: không có reply (timeout/mất kết nối) hoặc ret_code khác 0 là lỗi."""
+
+        async def _call(step: JsonDict) -> Any:
+            reply = await fn(step)
+            if reply is None:
+                raise BatchError(f"{step.get('op')}: robot không trả lời")
+            if isinstance(reply, dict) and reply.get("ret_code", 0) != 0:
+                raise BatchError(
+                    f"{step.get('op')}: robot trả lỗi ret_code={reply.get('ret_code')} {reply.get('err_msg', '')}".rstrip()
+                )
+            return reply
+
+        return _call
+
+    def _lift(self, step: JsonDict) -> Tuple[int, int]:
+        return OutputRegister.lift, int(step["height"])
+
+    def _stopper(self, step: JsonDict) -> Tuple[int, int]:
+        value = self.robot.stopper_value(step)
+        if value is None:
+            raise BatchError(f"stopper không hợp lệ: {step.get('status')}/{step.get('action')}")
+        return OutputRegister.stopper, value
+
+    def _conveyor(self, step: JsonDict) -> Tuple[int, int]:
+        value = self.robot.conveyor_actions.get(step["data"])
+        if value is None:
+            raise BatchError(f"conveyor không hợp lệ: {step['data']}")
+        return OutputRegister.conveyor, value
+
+    def _color(self, step: JsonDict) -> Tuple[int, int]:
+        value = self.robot.led_colors.get(step["color"])
+        if value is None:
+            raise BatchError(f"màu không hợp lệ: {step['color']}")
+        return OutputRegister.led, value
+
+    async def _action(self, step: JsonDict) -> Any:
+        action = {
+            "pause": self.async_robot.nav_pause,
+            "resume": self.async_robot.nav_resume,
+            "cancel": self.async_robot.nav_cancel,
+        }.get(step["type"])
+        if action is None:
+            raise BatchError(f"action không hợp lệ: {step['type']}")
+        return await action()
+
+    def supports(self, op: Any) -> bool:
+        return op in self.writes or op in self.calls
+
+    async def execute(self, step: JsonDict) -> Any:
+        """Chạy ngay một bước (không gom ghi); lỗi tham số ném BatchError/KeyError/..."""
+        op = step.get("op")
+        if op in self.writes:
+            address, value = self.writes[op](step)
+            self.robot.write_outputs({address: value})
+            return {"address": address, "value": value}
+        if op in self.calls:
+            return await self.calls[op](step)
+        raise BatchError(f"op không hợp lệ: {op}")
+
+    async def run(self, steps: List[JsonDict], stop_on_error: bool = True) -> JsonDict:
+        if not isinstance(steps, list) or not all(isinstance(step, dict) for step in steps):
+            raise BatchError("ops phải là danh sách object")
+        started = time.perf_counter()
+        results: List[Optional[JsonDict]] = [None] * len(steps)
+        flushes: List[JsonDict] = []
+        pending: Dict[int, int] = {}
+        pending_steps: List[int] = []
+        failed = False
+
+        def flush() -> None:
+            if not pending:
+                return
+            t0 = time.perf_counter()
+            runs = self.robot.write_outputs(pending)
+            flushes.append(
+                {
+                    "steps": list(pending_steps),
+                    "writes": [{"address": address, "values": values} for address, values in runs],
+                    "elapsed_ms": (time.perf_counter() - t0) * 1000,
+                }
+            )
+            pending.clear()
+            pending_steps.clear()
+
+        for index, step in enumerate(steps):
+            op = step.get("op")
+            t0 = time.perf_counter()
+            try:
+                if op in self.writes:
+                    address, value = self.writes[op](step)
+                    if address in pending:
+                        # cùng thanh ghi ghi hai lần: giữ thứ tự bằng cách ghi phần trước ra
+                        flush()
+                    pending[address] = value
+                    pending_steps.append(index)
+                    result: Any = {"address": address, "value": value}
+                elif op in self.calls:
+                    flush()
+                    result = await self.calls[op](step)
+                else:
+                    raise BatchError(f"op không hợp lệ: {op}")
+                results[index] = {"op": op, "ok": True, "result": result}
+            except (BatchError, KeyError, TypeError, ValueError) as exc:
+                results[index] = {"op": op, "ok": False, "error": str(exc) or type(exc).__name__}
+                failed = True
+            results[index]["elapsed_ms"] = (time.perf_counter() - t0) * 1000
+            if failed and stop_on_error:
+                break
+        flush()
+
+        return {
+            "ok": not failed,
+            "steps": [r for r in results if r is not None],
+            "flushes": flushes,
+            "elapsed_ms": (time.perf_counter() - started) * 1000,
+        }
@@ -0,0 +1,358 @@
+import argparse
+import asyncio
+import json
+import socket
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+import json_codec
+from frame import HEADER, PACK_FMT_STR, tranmit
+
+
+def _legacy_creat(reqId, msgType, msg={}):
+    # Bản sao frame.creat/tranmit.sendAPI trước khi có FrameCodec, chỉ để so sánh.
+    msgLen = 0
+    jsonStr = json.dumps(msg)
+    if (msg != {}):
+        msgLen = len(jsonStr)
+    rawMsg = struct.pack(PACK_FMT_STR, 0x5A, 0x01, reqId, msgLen, msgType, b'\x00\x00\x00\x00\x00\x00')
+    if (msg != {}):
+        rawMsg += bytearray(jsonStr, 'ascii')
+    return rawMsg
+
+
+def _legacy_send_api(headerAPI: socket.socket, code_api: int, jsonstring: dict):
+    headerAPI.send(_legacy_creat(1, code_api, jsonstring))
+    data = headerAPI.recv(16)
+    if len(data) < 16:
+        return None
+    header = struct.unpack(PACK_FMT_STR, data)
+    jsonDataLen = header[3]
+    data = b''
+    readSize = 1024
+    while (jsonDataLen > 0):
+        recv = headerAPI.recv(readSize)
+        data += recv
+        jsonDataLen -= len(recv)
+        if jsonDataLen < readSize:
+            readSize = jsonDataLen
+    return json.loads(data)
+
+
+def _reply_frame(size: int) -> bytes:
+    # JSON hợp lệ có độ dài đúng `size` byte
+    filler = max(size - len('{"ret_code":0,"path":""}'), 0)
+    body = json.dumps({"ret_code": 0, "path": "x" * filler}).encode("ascii")
+    return HEADER.pack(0x5A, 0x01, 1, len(body), 11100, b"\x00" * 6) + body
+
+
+def _echo_server(sock: socket.socket, reply: bytes, stop: threading.Event) -> None:
+    buf = bytearray(65536)
+    while not stop.is_set():
+        try:
+            n = sock.recv_into(buf)
+        except OSError:
+            break
+        if n == 0:
+            break
+        sock.sendall(reply)
+
+
+def _time_calls(fn: Callable, sock: socket.socket, iterations: int) -> float:
+    msg = {"keys": ["x", "y", "angle"]}
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn(sock, 1100, msg)
+    return (time.perf_counter() - start) / iterations
+
+
+def bench_frame_codec() -> Dict[str, Dict[str, float]]:
+    """So sánh tranmit.sendAPI (FrameCodec) với bản cũ cho reply 100 B, 10 KB, 1 MB."""
+    results: Dict[str, Dict[str, float]] = {}
+    for label, size, iterations in (("100B", 100, 5000), ("10KB", 10_000, 2000), ("1MB", 1_000_000, 30)):
+        row = {}
+        for name, fn in (("legacy", _legacy_send_api), ("codec", tranmit.sendAPI)):
+            client, server = socket.socketpair()
+            stop = threading.Event()
+            t = threading.Thread(target=_echo_server, args=(server, _reply_frame(size), stop), daemon=True)
+            t.start()
+            try:
+                _time_calls(fn, client, max(iterations // 10, 1))
+                row[name] = _time_calls(fn, client, iterations)
+            finally:
+                stop.set()
+                client.close()
+                server.close()
+                t.join(timeout=1.0)
+        results[label] = row
+        print(
+            f"[frame] {label:>5}: legacy {row['legacy'] * 1e6:9.1f} us"
+            f"  codec {row['codec'] * 1e6:9.1f} us"
+            f"  x{row['legacy'] / row['codec']:.2f}"
+        )
+    return results
+
+
+def _status_1100_payload() -> dict:
+    # Reply 1100 điển hình khi robot đang chạy: đủ 28 key, path vài trăm điểm
+    path = [[round(i * 0.05, 3), round(1.5 + i * 0.01, 3)] for i in range(400)]
+    return {
+        "ret_code": 0,
+        "create_on": "2026-10-18T08:00:00.000Z",
+        "confidence": 0.987,
+        "DI": [{"id": i, "source": "normal", "status": bool(i % 2), "valid": True} for i in range(16)],
+        "DO": [{"id": i, "source": "normal", "status": False} for i in range(16)],
+        "current_station": "LM101",
+        "charging": False,
+        "last_station": "LM100",
+        "vx": 0.612,
+        "vy": 0.0,
+        "blocked": False,
+        "block_reason": [],
+        "battery_level": 0.82,
+        "task_status": 2,
+        "target_id": "LM102",
+        "emergency": False,
+        "reloc_status": 1,
+        "fatals": [],
+        "errors": [{"54013": 1729238400, "desc": "Thiết bị ngoại vi mất kết nối", "times": 3}],
+        "warnings": [{"55105": 1729238400, "desc": "Low battery", "times": 1}],
+        "notices": [],
+        "current_ip": "192.168.192.5",
+        "x": 12.3456,
+        "y": -3.21,
+        "fork_height": 0.0,
+        "area_ids": ["A1", "A2"],
+        "angle": 1.5707,
+        "target_dist": 4.2,
+        "path": path,
+        "unfinished_path": path[200:],
+    }
+
+
+def bench_json_codec() -> Dict[str, Dict[str, float]]:
+    """Encode/decode payload status 1100 bằng json chuẩn và json_codec."""
+    payload = _status_1100_payload()
+    iterations = 2000
+    results: Dict[str, Dict[str, float]] = {}
+    for name, dumps, loads in (
+        ("json", json_codec._std_dumps, json_codec._std_loads),
+        (json_codec.BACKEND, json_codec.dumps, json_codec.loads),
+    ):
+        encoded = dumps(payload)
+        start = time.perf_counter()
+        for _ in range(iterations):
+            dumps(payload)
+        encode_s = (time.perf_counter() - start) / iterations
+        start = time.perf_counter()
+        for _ in range(iterations):
+            loads(encoded)
+        decode_s = (time.perf_counter() - start) / iterations
+        results[name] = {"encode": encode_s, "decode": decode_s, "bytes": len(encoded)}
+        print(
+            f"[json] {name:>7}: encode {encode_s * 1e6:7.1f} us"
+            f"  decode {decode_s * 1e6:7.1f} us  ({len(encoded)} B)"
+        )
+    return results
+
+
+def _latency_row(label: str, samples: List[float], elapsed_s: float, calls: int) -> Dict[str, float]:
+    samples = sorted(samples)
+    row = {
+        "p50_ms": samples[len(samples) // 2] * 1000,
+        "p99_ms": samples[min(int(len(samples) * 0.99), len(samples) - 1)] * 1000,
+        "throughput": calls / elapsed_s,
+    }
+    print(
+        f"[{label}] p50 {row['p50_ms']:7.2f} ms  p99 {row['p99_ms']:7.2f} ms"
+        f"  {row['throughput']:8.0f} req/s"
+    )
+    return row
+
+
+def _measure(label: str, call: Callable[[], object], iterations: int = 300, workers: int = 8) -> Dict[str, float]:
+    """Latency khi gọi tuần tự và throughput khi `workers` thread gọi đồng thời."""
+    samples = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - t0)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(workers) as pool:
+        list(pool.map(lambda _: call(), range(iterations)))
+    return _latency_row(label, samples, time.perf_counter() - start, iterations)
+
+
+def _point_at_sim(robot) -> None:
+    for channel in (robot.api_robot_status, robot.api_robot_navigation, robot.api_robot_control):
+        channel.host = "127.0.0.1"
+    robot.connect_all()
+
+
+def bench_robot() -> Dict[str, Dict[str, float]]:
+    """RobotAPI.status/navigation/monitor với robot giả (sim_robot) trên localhost."""
+    from control import RobotAPI
+    from sim_robot import SimConfig, SimRobot
+
+    results = {}
+    for payload in (0, 10_000):
+        sim = SimRobot("127.0.0.1", SimConfig(nav_time_s=0.0, payload_bytes=payload))
+        sim.start()
+        robot = RobotAPI("127.0.0.1")
+        _point_at_sim(robot)
+        try:
+            results[f"status_{payload}B"] = _measure(f"robot status +{payload}B", robot.status)
+            if payload == 0:
+                results["navigation"] = _measure("robot navigation", lambda: robot.navigation({"id": "LM102"}))
+                results["monitor"] = _measure(
+                    "robot monitor", lambda: robot.monitor({"vx": 0.0, "vy": 0.0, "w": 0.0})
+                )
+        finally:
+            robot.connection.stop()
+            sim.stop()
+    return results
+
+
+def bench_http() -> Dict[str, Dict[str, float]]:
+    """Các endpoint HTTP của app.py (qua ASGI, không qua mạng) với robot giả."""
+    import httpx
+
+    import app as app_module
+    from sim_robot import SimConfig, SimRobot
+
+    sim = SimRobot("127.0.0.1", SimConfig(nav_time_s=0.0))
+    sim.start()
+    _point_at_sim(app_module.control)
+    app_module.control.status()
+
+    async def _run(method: str, url: str, body, iterations: int = 300, concurrency: int = 16):
+        transport = httpx.ASGITransport(app=app_module.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://amr") as client:
+            samples = []
+            for _ in range(iterations):
+                t0 = time.perf_counter()
+                await client.request(method, url, json=body)
+                samples.append(time.perf_counter() - t0)
+            sem = asyncio.Semaphore(concurrency)
+
+            async def _one():
+                async with sem:
+                    await client.request(method, url, json=body)
+
+            start = time.perf_counter()
+            await asyncio.gather(*(_one() for _ in range(iterations)))
+            return samples, time.perf_counter() - start
+
+    results = {}
+    try:
+        for method, url, body in (
+            ("GET", "/status", None),
+            ("POST", "/navigation", {"id": "LM102"}),
+            ("POST", "/monitor", {"vx": 0.0, "vy": 0.0, "w": 0.0}),
+        ):
+            samples, elapsed = asyncio.run(_run(method, url, body))
+            results[f"{method} {url}"] = _latency_row(f"http {method} {url}", samples, elapsed, len(samples))
+    finally:
+        app_module.control.connection.stop()
+        sim.stop()
+    return results
+
+
+def bench_stations() -> Dict[str, Dict[str, float]]:
+    """Tra trạm gần nhất/trong bán kính trên StationIndex so với duyệt toàn bộ."""
+    import math
+    import random
+
+    from stations import Station, StationIndex
+
+    rng = random.Random(1)
+    stations = [Station(f"LM{i}", rng.uniform(0, 200), rng.uniform(0, 100)) for i in range(2000)]
+    index = StationIndex(stations)
+    points = [(rng.uniform(0, 200), rng.uniform(0, 100)) for _ in range(2000)]
+    results: Dict[str, Dict[str, float]] = {}
+    for name, fn in (
+        ("scan nearest", lambda x, y: min(stations, key=lambda s: math.hypot(s.x - x, s.y - y))),
+        ("grid nearest", index.nearest),
+        ("grid within 5m", lambda x, y: index.within(x, y, 5.0)),
+        ("grid distance", lambda x, y: index.distance(x, y, "LM42")),
+    ):
+        start = time.perf_counter()
+        for x, y in points:
+            fn(x, y)
+        per_call = (time.perf_counter() - start) / len(points)
+        results[name] = {"per_call": per_call}
+        print(f"[stations] {name:>15}: {per_call * 1e6:8.2f} us ({len(stations)} stations)")
+    return results
+
+
+def bench_metrics() -> Dict[str, Dict[str, float]]:
+    """Chi phí ghi một sự kiện metrics trên đường nóng."""
+    from metrics import Counter, Histogram
+
+    counter = Counter("bench_counter", "bench", ("port",)).labels(19204)
+    histogram = Histogram("bench_rtt", "bench", ("port", "code")).labels(19204, 1100)
+    iterations = 200000
+    results: Dict[str, Dict[str, float]] = {}
+    for name, fn in (("counter inc", counter.inc), ("histogram observe", lambda: histogram.observe(0.003))):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        per_call = (time.perf_counter() - start) / iterations
+        results[name] = {"per_call": per_call}
+        print(f"[metrics] {name:>17}: {per_call * 1e9:7.1f} ns")
+    return results
+
+
+def bench_history() -> Dict[str, Dict[str, float]]:
+    """Ghi một mẫu và truy vấn 1 giờ sensor trên ring buffer lịch sử đầy (mẫu mỗi 0.5 s)."""
+    from history import RegisterHistory
+    from registers import RegisterSnapshot
+
+    capacity = 500000
+    history = RegisterHistory(capacity)
+    snapshots = [RegisterSnapshot(i + 1, tuple([i % 7] * 30), tuple([0] * 30)) for i in range(capacity)]
+    for i, snapshot in enumerate(snapshots):
+        snapshot.ts_ms = i * 500
+    start = time.perf_counter()
+    for snapshot in snapshots:
+        history.record(snapshot)
+    record = (time.perf_counter() - start) / capacity
+    end_ms = snapshots[-1].ts_ms
+    iterations = 20
+    start = time.perf_counter()
+    for _ in range(iterations):
+        history.query(end_ms - 3600_000, end_ms, address=0x0A, count=10)
+    query = (time.perf_counter() - start) / iterations
+    print(f"[history] record: {record * 1e6:7.2f} us")
+    print(f"[history] query 1h x 10 registers: {query * 1000:7.2f} ms")
+    return {"record": {"per_call": record}, "query_1h": {"per_call": query}}
+
+
+BENCHES = {
+    "frame": bench_frame_codec,
+    "json": bench_json_codec,
+    "robot": bench_robot,
+    "http": bench_http,
+    "metrics": bench_metrics,
+    "history": bench_history,
+    "stations": bench_stations,
+}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Micro-benchmark cho AMR")
+    parser.add_argument("names", nargs="*", help="Tên benchmark: " + ", ".join(sorted(BENCHES)))
+    args = parser.parse_args()
+    unknown = [n for n in args.names if n not in BENCHES]
+    if unknown:
+        parser.error(f"benchmark không tồn tại: {', '.join(unknown)}")
+    for name in args.names or sorted(BENCHES):
+        BENCHES[name]()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
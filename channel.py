@@ -0,0 +1,375 @@
+import logging
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from api import control, navigation, other
+import tracing
+from frame import HEADER_SIZE, FrameCodec
+from json_codec import DecodeError
+from metrics import (
+    ROBOT_BYTES,
+    ROBOT_DROPPED_REPLIES,
+    ROBOT_HEAD_ERRORS,
+    ROBOT_RTT,
+    ROBOT_SEND_ERRORS,
+    ROBOT_TIMEOUTS,
+)
+
+JsonDict = Dict[str, Any]
+
+# Robot trả lời với msgType = msgType của request + 10000
+RESPONSE_OFFSET = 10000
+MAX_REQ_ID = 0xFFFF
+
+
+class Lane:
+    critical = 0
+    command = 1
+    telemetry = 2
+
+
+LANE_NAMES = {Lane.critical: "critical", Lane.command: "command", Lane.telemetry: "telemetry"}
+
+# Lệnh an toàn luôn được gửi trước, không phải chờ slot max_in_flight
+CRITICAL_CODES = {
+    navigation.robot_task_cancel_req,
+    navigation.robot_task_pause_req,
+    control.robot_control_stop_req,
+    other.robot_other_softemc_req,
+}
+
+
+def lane_for(msgType: int) -> int:
+    if msgType in CRITICAL_CODES:
+        return Lane.critical
+    if 1000 <= msgType < 2000:
+        return Lane.telemetry
+    return Lane.command
+
+
+@dataclass
+class LaneStats:
+    """Thời gian một frame nằm trong hàng đợi trước khi được gửi đi."""
+
+    count: int = 0
+    total_s: float = 0.0
+    max_s: float = 0.0
+
+    def record(self, delay_s: float) -> None:
+        self.count += 1
+        self.total_s += delay_s
+        if delay_s > self.max_s:
+            self.max_s = delay_s
+
+    def as_dict(self) -> JsonDict:
+        return {
+            "count": self.count,
+            "avg_ms": self.total_s * 1000 / self.count if self.count else 0.0,
+            "max_ms": self.max_s * 1000,
+        }
+
+
+class RobotChannel:
+    """
+    Kết nối TCP tới một port của robot (19204/19205/19206) cho phép nhiều
+    request cùng bay (pipelining).
+
+    Mỗi request nhận một reqId riêng; một thread đọc duy nhất nhận reply và
+    trả về đúng Future đang chờ theo cặp (reqId, msgType) trong header.
+    submit() không bao giờ chặn: khi đã đủ max_in_flight request chờ reply,
+    frame mới nằm trong hàng đợi và được gửi khi có reply trả về.
+
+    Hàng đợi chia theo lane: critical (cancel/pause/stop/soft-estop) luôn đi
+    trước và không bị giới hạn max_in_flight, rồi tới command, cuối cùng là
+    telemetry (poll status).
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        *,
+        timeout_s: float = 10.0,
+        max_in_flight: int = 8,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.timeout_s = timeout_s
+        self.max_in_flight = max_in_flight
+        self.log = logger or logging.getLogger(f"robot_channel.{port}")
+
+        self._sock: Optional[socket.socket] = None
+        self._send_lock = threading.Lock()
+        self._waiting: List[Deque[Tuple[int, bytes, float]]] = [deque() for _ in LANE_NAMES]
+        self._lane_stats: List[LaneStats] = [LaneStats() for _ in LANE_NAMES]
+        self._sent: Set[int] = set()
+
+        # reqId -> (msgType reply mong đợi, future, thời điểm submit rồi thời điểm gửi xong)
+        self._pending: Dict[int, Tuple[int, Future, float]] = {}
+        # histogram RTT theo msgType reply, tra sẵn để đường đọc không phải dựng nhãn
+        self._rtt: Dict[int, Any] = {}
+        self._bytes_out = ROBOT_BYTES.labels(port, "out")
+        self._bytes_in = ROBOT_BYTES.labels(port, "in")
+        self._send_errors = ROBOT_SEND_ERRORS.labels(port)
+        self._dropped = ROBOT_DROPPED_REPLIES.labels(port)
+        # chỉ request thuộc trace được lấy mẫu: reqId -> [trace, msgType, submit, send0, send1]
+        self._traced: Dict[int, list] = {}
+        self._pending_lock = threading.Lock()
+        self._next_id = 0
+
+        self._reader: Optional[threading.Thread] = None
+        # Gọi khi kết nối bị đóng (robot reboot, mất Wi-Fi, ...), xem ConnectionManager
+        self.on_disconnect: Optional[Callable[["RobotChannel"], None]] = None
+
+    @property
+    def connected(self) -> bool:
+        return self._sock is not None
+
+    def open_socket(self) -> socket.socket:
+        """Mở một socket mới tới port này, chưa gắn vào channel."""
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout_s)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # keepalive ngắn để phát hiện kết nối chết khi robot mất điện/mất mạng
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        for opt, value in (("TCP_KEEPIDLE", 2), ("TCP_KEEPINTVL", 1), ("TCP_KEEPCNT", 3), ("TCP_USER_TIMEOUT", 5000)):
+            if hasattr(socket, opt):
+                sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, opt), value)
+        return sock
+
+    def connect(self) -> None:
+        self.attach(self.open_socket())
+
+    def attach(self, sock: socket.socket) -> None:
+        # Thread đọc chặn vô thời hạn; timeout được tính theo từng request
+        sock.settimeout(None)
+        self._sock = sock
+        self._reader = threading.Thread(
+            target=self._read_loop, args=(sock,), name=f"robot_reader_{self.port}", daemon=True
+        )
+        self._reader.start()
+
+    def close(self) -> None:
+        sock, self._sock = self._sock, None
+        if sock is None:
+            return
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        try:
+            sock.close()
+        except OSError:
+            pass
+        self._fail_pending()
+        if self.on_disconnect is not None:
+            self.on_disconnect(self)
+
+    def submit(self, msgType: int, msg: Optional[JsonDict] = None, lane: Optional[int] = None) -> Future:
+        """Gửi request không chờ reply; Future trả về dict JSON hoặc lỗi kết nối."""
+        sock = self._sock
+        fut: Future = Future()
+        if sock is None:
+            fut.set_exception(ConnectionError(f"port {self.port} not connected"))
+            return fut
+
+        reqId = self._register(msgType, fut)
+        trace = tracing.current()
+        if trace is not None:
+            self._traced[reqId] = [trace, msgType, time.perf_counter(), 0.0, 0.0]
+        data = FrameCodec.encode(reqId, msgType, msg)
+        if lane is None:
+            lane = lane_for(msgType)
+        with self._send_lock:
+            self._waiting[lane].append((reqId, data, time.perf_counter()))
+        self._pump()
+        return fut
+
+    def request(
+        self,
+        msgType: int,
+        msg: Optional[JsonDict] = None,
+        timeout_s: Optional[float] = None,
+        lane: Optional[int] = None,
+    ):
+        """Gửi request và chờ reply; trả None nếu lỗi hoặc hết thời gian như tranmit.sendAPI."""
+        with tracing.span("robot", {"port": self.port, "code": msgType}):
+            fut = self.submit(msgType, msg, lane)
+            try:
+                return fut.result(self.timeout_s if timeout_s is None else timeout_s)
+            except FutureTimeout:
+                self.expire(fut, msgType)
+                return None
+            except Exception:
+                return None
+
+    def expire(self, fut: Future, msgType: int) -> None:
+        """Bỏ request đã hết thời gian chờ: log, đếm timeout và giải phóng reqId."""
+        logging.error("TIME OUT RECT FRAME TO AMR")
+        ROBOT_TIMEOUTS.labels(self.port, msgType).inc()
+        self.cancel(fut)
+
+    def cancel(self, fut: Future) -> None:
+        reqId = None
+        with self._pending_lock:
+            for rid, (_, pending, _) in list(self._pending.items()):
+                if pending is fut:
+                    del self._pending[rid]
+                    reqId = rid
+                    break
+        if reqId is not None and self._traced:
+            self._traced.pop(reqId, None)
+        fut.cancel()
+        if reqId is not None:
+            self._release(reqId)
+
+    def lane_stats(self) -> Dict[str, JsonDict]:
+        with self._send_lock:
+            return {LANE_NAMES[lane]: stats.as_dict() for lane, stats in enumerate(self._lane_stats)}
+
+    def _next_waiting(self) -> Optional[Tuple[int, int, bytes, float]]:
+        for lane, queue in enumerate(self._waiting):
+            if queue and (lane == Lane.critical or len(self._sent) < self.max_in_flight):
+                return (lane,) + queue.popleft()
+        return None
+
+    def _pump(self) -> None:
+        failed = []
+        with self._send_lock:
+            sock = self._sock
+            while True:
+                item = self._next_waiting()
+                if item is None:
+                    break
+                lane, reqId, data, enqueued_at = item
+                self._lane_stats[lane].record(time.perf_counter() - enqueued_at)
+                with self._pending_lock:
+                    if reqId not in self._pending:
+                        continue
+                if sock is None:
+                    failed.append((reqId, ConnectionError(f"port {self.port} not connected")))
+                    continue
+                timing = self._traced.get(reqId) if self._traced else None
+                try:
+                    if timing is not None:
+                        timing[3] = time.perf_counter()
+                    sock.sendall(data)
+                    sent_at = time.perf_counter()
+                    if timing is not None:
+                        timing[4] = sent_at
+                    # RTT tính từ lúc frame rời socket, không gồm thời gian chờ lane
+                    # (đã có trong lane_stats)
+                    with self._pending_lock:
+                        entry = self._pending.get(reqId)
+                        if entry is not None:
+                            self._pending[reqId] = (entry[0], entry[1], sent_at)
+                    self._sent.add(reqId)
+                    self._bytes_out.inc(len(data))
+                except OSError as exc:
+                    logging.error("SEND FRAME TO AMR ERROR")
+                    self._send_errors.inc()
+                    failed.append((reqId, exc))
+        for reqId, exc in failed:
+            self._resolve(reqId, exc)
+
+    def _release(self, reqId: int) -> None:
+        with self._send_lock:
+            if reqId not in self._sent:
+                return
+            self._sent.discard(reqId)
+        self._pump()
+
+    def _register(self, msgType: int, fut: Future) -> int:
+        with self._pending_lock:
+            for _ in range(MAX_REQ_ID):
+                self._next_id = self._next_id % MAX_REQ_ID + 1
+                if self._next_id not in self._pending:
+                    break
+            reqId = self._next_id
+            self._pending[reqId] = (msgType + RESPONSE_OFFSET, fut, time.perf_counter())
+        return reqId
+
+    def _resolve(self, reqId: int, result: Any) -> None:
+        with self._pending_lock:
+            entry = self._pending.pop(reqId, None)
+        if self._traced:
+            self._traced.pop(reqId, None)
+        self._release(reqId)
+        if entry is None:
+            return
+        fut = entry[1]
+        if fut.done():
+            return
+        if isinstance(result, BaseException):
+            fut.set_exception(result)
+        else:
+            fut.set_result(result)
+
+    def _trace_reply(self, timing: list, head_at: float) -> None:
+        trace, msgType, submitted, send_start, send_end = timing
+        if not send_end or not head_at:
+            return
+        attrs = {"port": self.port, "code": msgType}
+        trace.add("queue_wait", submitted, send_start, attrs)
+        trace.add("send", send_start, send_end, attrs)
+        trace.add("robot_wait", send_end, head_at, attrs)
+        trace.add("recv", head_at, time.perf_counter(), attrs)
+
+    def _fail_pending(self) -> None:
+        with self._pending_lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+            self._traced.clear()
+        with self._send_lock:
+            for queue in self._waiting:
+                queue.clear()
+            self._sent.clear()
+        for _, fut, _ in pending:
+            if not fut.done():
+                fut.set_exception(ConnectionError(f"port {self.port} closed"))
+
+    def _read_loop(self, sock: socket.socket) -> None:
+        codec = FrameCodec()
+        try:
+            while True:
+                header = codec.read_header(sock)
+                head_at = time.perf_counter() if self._traced else 0.0
+                if header is None:
+                    if self._sock is sock:
+                        logging.error("PACK HEAD ERROR")
+                        ROBOT_HEAD_ERRORS.labels(self.port).inc()
+                    break
+                body = codec.read_body(sock, header[3])
+                self._bytes_in.inc(HEADER_SIZE + header[3])
+                reqId, msgType = header[2], header[4]
+                with self._pending_lock:
+                    entry = self._pending.get(reqId)
+                    if entry is not None and entry[0] != msgType:
+                        # reply muộn của một request đã hết hạn và reqId đã bị dùng lại
+                        entry = None
+                if entry is None:
+                    self.log.warning("Drop reply reqId=%s msgType=%s: no waiting request", reqId, msgType)
+                    self._dropped.inc()
+                    continue
+                rtt = self._rtt.get(msgType)
+                if rtt is None:
+                    rtt = self._rtt[msgType] = ROBOT_RTT.labels(self.port, msgType - RESPONSE_OFFSET)
+                rtt.observe(time.perf_counter() - entry[2])
+                try:
+                    result = codec.decode(body) if header[3] else None
+                except DecodeError:
+                    result = None
+                timing = self._traced.get(reqId) if self._traced else None
+                if timing is not None:
+                    self._trace_reply(timing, head_at)
+                self._resolve(reqId, result)
+        except OSError:
+            pass
+        finally:
+            if self._sock is sock:
+                self.close()
@@ -0,0 +1,206 @@
+import ast
+import operator
+from typing import Any, Callable, Dict, Tuple
+
+from control import Color, Dir, RobotAPI, Stopper
+from registers import HOLDING, INPUT
+
+Evaluator = Callable[[], Any]
+
+MAX_CONDITION_LENGTH = 512
+
+# Tên thanh ghi dùng trong điều kiện: field holding theo tên, field input có tiền tố out_
+REGISTERS: Dict[str, Tuple[str, str]] = {
+    **{name: ("holding", name) for name in HOLDING.fields},
+    **{"out_" + name: ("outputs", name) for name in INPUT.fields},
+}
+
+# Hằng số dùng được dạng Dir.cw_out, Color.green, Stopper.all_on
+CONSTANTS: Dict[str, type] = {"Dir": Dir, "Color": Color, "Stopper": Stopper}
+
+_COMPARE = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.In: lambda a, b: a in b,
+    ast.NotIn: lambda a, b: a not in b,
+}
+
+_BINARY = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.Mod: operator.mod,
+    ast.BitAnd: operator.and_,
+    ast.BitOr: operator.or_,
+}
+
+
+class ConditionError(ValueError):
+    pass
+
+
+class _Compiler:
+    """
+    Dịch biểu thức điều kiện (cú pháp Python con) thành cây closure.
+
+    Không dùng eval: chỉ chấp nhận so sánh, and/or/not, số học cơ bản, hằng,
+    chỉ số [] và tên. Tên là thanh ghi (REGISTERS, hr[n], ir[n]), hằng số
+    (Dir/Color/Stopper) hoặc một field của data_status (None nếu chưa có).
+    """
+
+    def __init__(self, robot: RobotAPI) -> None:
+        self.robot = robot
+        self.uses_registers = False
+
+    def compile(self, node: ast.AST) -> Evaluator:
+        method = getattr(self, "_" + type(node).__name__, None)
+        if method is None:
+            raise ConditionError(f"cú pháp không hỗ trợ: {type(node).__name__}")
+        return method(node)
+
+    def _Expression(self, node: ast.Expression) -> Evaluator:
+        return self.compile(node.body)
+
+    def _Constant(self, node: ast.Constant) -> Evaluator:
+        value = node.value
+        return lambda: value
+
+    def _List(self, node: ast.List) -> Evaluator:
+        items = [self.compile(elt) for elt in node.elts]
+        return lambda: [item() for item in items]
+
+    _Tuple = _List
+
+    def _Name(self, node: ast.Name) -> Evaluator:
+        name = node.id
+        if name in ("True", "False", "None"):
+            value = {"True": True, "False": False, "None": None}[name]
+            return lambda: value
+        if name in REGISTERS:
+            group, field_name = REGISTERS[name]
+            self.uses_registers = True
+            registers = self.robot.registers
+            return lambda: getattr(registers.current(), group)[field_name]
+        if name in ("hr", "ir") or name in CONSTANTS:
+            raise ConditionError(f"{name} cần dùng kèm chỉ số hoặc thuộc tính")
+        snapshots = self.robot.snapshots
+
+        def field() -> Any:
+            data = snapshots.current().data
+            return data.get(name) if data else None
+
+        return field
+
+    def _Attribute(self, node: ast.Attribute) -> Evaluator:
+        if not isinstance(node.value, ast.Name) or node.value.id not in CONSTANTS:
+            raise ConditionError("chỉ hỗ trợ hằng số Dir.*, Color.*, Stopper.*")
+        namespace = CONSTANTS[node.value.id]
+        if node.attr.startswith("_") or not hasattr(namespace, node.attr):
+            raise ConditionError(f"không có hằng số {node.value.id}.{node.attr}")
+        value = getattr(namespace, node.attr)
+        return lambda: value
+
+    def _Subscript(self, node: ast.Subscript) -> Evaluator:
+        if isinstance(node.value, ast.Name) and node.value.id in ("hr", "ir"):
+            kind = node.value.id
+            if not isinstance(node.slice, ast.Constant) or not isinstance(node.slice.value, int):
+                raise ConditionError(f"{kind}[n] cần địa chỉ là số nguyên")
+            address = node.slice.value
+            self.uses_registers = True
+            read = self.robot.read_registers
+            return lambda: read(kind, address, 1)[0]
+        value = self.compile(node.value)
+        index = self.compile(node.slice)
+        return lambda: value()[index()]
+
+    def _Compare(self, node: ast.Compare) -> Evaluator:
+        left = self.compile(node.left)
+        ops = []
+        for op, comparator in zip(node.ops, node.comparators):
+            fn = _COMPARE.get(type(op))
+            if fn is None:
+                raise ConditionError(f"phép so sánh không hỗ trợ: {type(op).__name__}")
+            ops.append((fn, self.compile(comparator)))
+
+        def compare() -> bool:
+            a = left()
+            for fn, right in ops:
+                b = right()
+                if not fn(a, b):
+                    return False
+                a = b
+            return True
+
+        return compare
+
+    def _BoolOp(self, node: ast.BoolOp) -> Evaluator:
+        values = [self.compile(v) for v in node.values]
+        if isinstance(node.op, ast.And):
+            return lambda: all(v() for v in values)
+        return lambda: any(v() for v in values)
+
+    def _UnaryOp(self, node: ast.UnaryOp) -> Evaluator:
+        operand = self.compile(node.operand)
+        if isinstance(node.op, ast.Not):
+            return lambda: not operand()
+        if isinstance(node.op, ast.USub):
+            return lambda: -_number(operand(), "-")
+        raise ConditionError(f"toán tử không hỗ trợ: {type(node.op).__name__}")
+
+    def _BinOp(self, node: ast.BinOp) -> Evaluator:
+        fn = _BINARY.get(type(node.op))
+        if fn is None:
+            raise ConditionError(f"toán tử không hỗ trợ: {type(node.op).__name__}")
+        name = type(node.op).__name__
+        left = self.compile(node.left)
+        right = self.compile(node.right)
+        # chỉ số học trên số: list/str * n hay + sẽ cấp phát theo dữ liệu người dùng
+        return lambda: fn(_number(left(), name), _number(right(), name))
+
+
+def _number(value: Any, op: str) -> Any:
+    if isinstance(value, (int, float)):
+        return value
+    if value is None:
+        # field status chưa có: điều kiện sai, không phải lỗi cú pháp
+        raise TypeError(op)
+    raise ConditionError(f"toán tử {op} chỉ dùng cho số, không dùng cho {type(value).__name__}")
+
+
+def compile_condition(expr: str, robot: RobotAPI) -> Tuple[Callable[[], bool], bool]:
+    """
+    Dịch điều kiện thành (predicate, uses_registers).
+
+    Ví dụ: 'task_status == 4 and current_station == "LM2"',
+    'conveyor == Dir.stop and sensor[5] == 1', 'hr[3] in (1, 2)'.
+    Lỗi kiểu/chỉ số lúc đánh giá (field chưa có, ...) coi như điều kiện sai;
+    số học trên giá trị không phải số ném ConditionError (HTTP 400).
+    """
+    if not isinstance(expr, str) or not expr.strip():
+        raise ConditionError("điều kiện rỗng")
+    if len(expr) > MAX_CONDITION_LENGTH:
+        raise ConditionError("điều kiện quá dài")
+    try:
+        tree = ast.parse(expr.strip(), mode="eval")
+    except SyntaxError as e:
+        raise ConditionError(f"điều kiện sai cú pháp: {e.msg}")
+    compiler = _Compiler(robot)
+    try:
+        evaluate = compiler.compile(tree)
+    except RecursionError:
+        raise ConditionError("điều kiện lồng quá sâu")
+
+    def predicate() -> bool:
+        try:
+            return bool(evaluate())
+        except (TypeError, IndexError, KeyError, ZeroDivisionError):
+            return False
+        except (OverflowError, RecursionError) as e:
+            raise ConditionError(f"không đánh giá được điều kiện: {type(e).__name__}")
+
+    return predicate, compiler.uses_registers
@@ -1,7 +1,38 @@
-HOST_ROBOT = "192.168.192.5"
+import json
+import os
+
+HOST_ROBOT = os.environ.get("HOST_ROBOT", "192.168.192.5")
+
+# Tỉ lệ request HTTP được trace (0..1), xem /debug/traces
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", "0.01"))
 
 APP_HOST = "0.0.0.0"
 APP_PORT = 8000
 
 SOCKET_HOST = "0.0.0.0"
-SOCKET_PORT = 502
\ No newline at end of file
+SOCKET_PORT = 502
+
+# Modbus TCP dùng chung thanh ghi với RTU; tắt mặc định (port 502 cần quyền root)
+MODBUS_TCP_ENABLED = os.environ.get("MODBUS_TCP", "0") == "1"
+MODBUS_TCP_HOST = SOCKET_HOST
+MODBUS_TCP_PORT = int(os.environ.get("MODBUS_TCP_PORT", SOCKET_PORT))
+# Cho client TCP ghi thanh ghi; mặc định chỉ đọc vì holding register do PLC trên RTU ghi
+MODBUS_TCP_WRITE = os.environ.get("MODBUS_TCP_WRITE", "0") == "1"
+
+# Số mẫu tối đa của lịch sử thanh ghi (/history/registers), 128 byte/mẫu
+HISTORY_CAPACITY = int(os.environ.get("HISTORY_CAPACITY", "500000"))
+
+# Cảm biến băng tải: lấy mẫu mỗi SENSOR_SAMPLE_S giây rồi lọc trên SENSOR_WINDOW mẫu
+# (SENSOR_FILTER: debounce, majority hoặc hysteresis), xem /sensors
+SENSOR_SAMPLE_S = float(os.environ.get("SENSOR_SAMPLE_S", "0.01"))
+SENSOR_FILTER = os.environ.get("SENSOR_FILTER", "debounce")
+SENSOR_WINDOW = int(os.environ.get("SENSOR_WINDOW", "5"))
+
+# Thiết bị Modbus (slave) trên bus RS485: tên -> slave id và số thanh ghi holding/input.
+# "fields" (tùy chọn): {"holding": [{"name", "address", "count", "type"}], "input": [...]};
+# thiết bị "main" dùng bản đồ HOLDING/INPUT trong registers.py.
+# Ghi đè bằng biến môi trường MODBUS_DEVICES (JSON cùng dạng), ví dụ thêm
+# "io2": {"slave": 2, "holding": 16, "input": 16}.
+MODBUS_DEVICES = json.loads(os.environ.get("MODBUS_DEVICES", "null")) or {
+    "main": {"slave": 0x01, "holding": 30, "input": 30},
+}
@@ -0,0 +1,192 @@
+import logging
+import random
+import socket
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterable, Optional
+
+from channel import RobotChannel
+
+JsonDict = Dict[str, Any]
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+class ConnectionState:
+    disconnected = "disconnected"
+    connecting = "connecting"
+    connected = "connected"
+
+
+@dataclass
+class PortStatus:
+    state: str = ConnectionState.disconnected
+    reconnects: int = 0
+    failures: int = 0
+    last_error: str = ""
+    connected_at_ms: int = 0
+    standby: bool = False
+
+
+def _socket_alive(sock: socket.socket) -> bool:
+    """Kiểm tra socket standby còn sống mà không lấy dữ liệu ra khỏi buffer."""
+    try:
+        sock.setblocking(False)
+        try:
+            return sock.recv(1, socket.MSG_PEEK) != b""
+        except BlockingIOError:
+            return True
+        finally:
+            sock.setblocking(True)
+    except OSError:
+        return False
+
+
+class ConnectionManager:
+    """
+    Quản lý kết nối tới các port của robot.
+
+    - Kết nối song song tất cả các port.
+    - Mỗi port có một thread giám sát: khi channel mất kết nối thì kết nối
+      lại ngay, thất bại thì thử lại với backoff lũy thừa có jitter.
+    - Tùy chọn giữ sẵn một socket standby đã kết nối cho mỗi port, để khi
+      kết nối chính chết chỉ cần gắn socket standby vào channel.
+    """
+
+    def __init__(
+        self,
+        channels: Iterable[RobotChannel],
+        *,
+        warm_standby: bool = True,
+        backoff_initial_s: float = 0.05,
+        backoff_max_s: float = 5.0,
+        check_interval_s: float = 1.0,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        self.channels = list(channels)
+        self.warm_standby = warm_standby
+        self.backoff_initial_s = backoff_initial_s
+        self.backoff_max_s = backoff_max_s
+        self.check_interval_s = check_interval_s
+        self.log = logger or logging.getLogger("connection_manager")
+
+        self._status: Dict[int, PortStatus] = {ch.port: PortStatus() for ch in self.channels}
+        self._status_lock = threading.Lock()
+        self._standby: Dict[int, Optional[socket.socket]] = {ch.port: None for ch in self.channels}
+        self._wake: Dict[int, threading.Event] = {ch.port: threading.Event() for ch in self.channels}
+        self._ready: Dict[int, threading.Event] = {ch.port: threading.Event() for ch in self.channels}
+        self._stop_event = threading.Event()
+        self._threads = []
+
+    def start(self, wait_s: float = 10.0) -> bool:
+        """Bắt đầu giám sát; chờ tối đa wait_s để mọi port kết nối xong."""
+        if self._threads:
+            return self.wait_connected(wait_s)
+        self._stop_event.clear()
+        for ch in self.channels:
+            ch.on_disconnect = self._on_disconnect
+            t = threading.Thread(target=self._supervise, args=(ch,), name=f"robot_conn_{ch.port}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self.wait_connected(wait_s)
+
+    def wait_connected(self, wait_s: float) -> bool:
+        deadline = time.monotonic() + wait_s
+        for event in self._ready.values():
+            if not event.wait(max(deadline - time.monotonic(), 0.0)):
+                return False
+        return True
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        for event in self._wake.values():
+            event.set()
+        for ch in self.channels:
+            ch.on_disconnect = None
+            ch.close()
+        for port, sock in self._standby.items():
+            if sock is not None:
+                sock.close()
+            self._standby[port] = None
+        for t in self._threads:
+            t.join(timeout=2.0)
+        self._threads = []
+
+    def status(self) -> Dict[int, JsonDict]:
+        with self._status_lock:
+            return {port: asdict(st) for port, st in self._status.items()}
+
+    def _on_disconnect(self, ch: RobotChannel) -> None:
+        with self._status_lock:
+            self._status[ch.port].state = ConnectionState.disconnected
+        self._ready[ch.port].clear()
+        self._wake[ch.port].set()
+
+    def _take_standby(self, port: int) -> Optional[socket.socket]:
+        sock, self._standby[port] = self._standby[port], None
+        with self._status_lock:
+            self._status[port].standby = False
+        if sock is not None and not _socket_alive(sock):
+            sock.close()
+            return None
+        return sock
+
+    def _next_delay(self, backoff_s: float) -> float:
+        return backoff_s * random.uniform(0.5, 1.5)
+
+    def _supervise(self, ch: RobotChannel) -> None:
+        port = ch.port
+        backoff_s = self.backoff_initial_s
+        ever_connected = False
+        while not self._stop_event.is_set():
+            self._wake[port].clear()
+
+            if not ch.connected:
+                with self._status_lock:
+                    self._status[port].state = ConnectionState.connecting
+                try:
+                    sock = self._take_standby(port) or ch.open_socket()
+                    ch.attach(sock)
+                except OSError as exc:
+                    with self._status_lock:
+                        st = self._status[port]
+                        st.state = ConnectionState.disconnected
+                        st.failures += 1
+                        st.last_error = str(exc)
+                    self.log.warning("Connect port %s failed: %s", port, exc)
+                    self._stop_event.wait(self._next_delay(backoff_s))
+                    backoff_s = min(backoff_s * 2, self.backoff_max_s)
+                    continue
+
+                with self._status_lock:
+                    st = self._status[port]
+                    st.state = ConnectionState.connected
+                    st.connected_at_ms = _now_ms()
+                    if ever_connected:
+                        st.reconnects += 1
+                ever_connected = True
+                backoff_s = self.backoff_initial_s
+                self._ready[port].set()
+                self.log.info("Robot port %s connected", port)
+
+            if self.warm_standby:
+                self._refresh_standby(ch)
+
+            self._wake[port].wait(self.check_interval_s)
+
+    def _refresh_standby(self, ch: RobotChannel) -> None:
+        sock = self._standby[ch.port]
+        if sock is not None:
+            if _socket_alive(sock):
+                return
+            sock.close()
+        try:
+            sock = ch.open_socket()
+        except OSError:
+            sock = None
+        self._standby[ch.port] = sock
+        with self._status_lock:
+            self._status[ch.port].standby = sock is not None
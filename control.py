@@ -1,10 +1,20 @@
-from socket import socket
-from frame import tranmit
+from channel import RobotChannel
+from connection import ConnectionManager
+from polling import StatusPoller
+from push import PushSubscriber
+from snapshot import StatusStore
+from sensors import SensorFilter, SensorPipeline
+from stations import StationMap
+import tracing
 from api import navigation, status, control
 from modbus_server import ModbusServer
+from devices import Device, DeviceError
+from registers import HOLDING, INPUT, MAIN_DEVICE
+from config import SENSOR_FILTER, SENSOR_SAMPLE_S, SENSOR_WINDOW
 
+import asyncio
 import logging
-import socket
+import threading
 
 
 class Color:
@@ -31,17 +41,41 @@ class Stopper:
     all_on = 6
 
 
+# Địa chỉ lấy từ bản đồ thanh ghi trong registers.py
+class OutputRegister:
+    led = INPUT.address("led")
+    lift = INPUT.address("lift")
+    stopper = INPUT.address("stopper")
+    conveyor = INPUT.address("conveyor")
+
+
+class StatusRegister:
+    lift = HOLDING.address("lift")
+    stopper = HOLDING.address("stopper")
+    conveyor = HOLDING.address("conveyor")
+    sensor = HOLDING.address("sensor")
+
+
+# Kênh cảm biến (chỉ số trong block sensor) đưa vào data_status: "sensor" là giá trị
+# thanh ghi thô như trước, "sensor_stable"/"sensor_edge_ms" là giá trị 0/1 sau bộ lọc
+SENSOR_CHANNELS = (5, 6)
+
 modbus = ModbusServer()
 
 
 class RobotAPI:
-    def __init__(self, host: str):
+    def __init__(self, host: str, modbus_server: ModbusServer = modbus):
         self.host = host
-        self.api_robot_navigation = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.api_robot_status = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.api_robot_control = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.modbus = modbus_server
+        self.api_robot_navigation = RobotChannel(host, 19206)
+        self.api_robot_status = RobotChannel(host, 19204)
+        self.api_robot_control = RobotChannel(host, 19205)
+        self.connection = ConnectionManager(
+            [self.api_robot_status, self.api_robot_navigation, self.api_robot_control]
+        )
 
-        self.data_status = None
+        self.snapshots = StatusStore()
+        self._status_lock = threading.Lock()
         self.keys = {
             "keys": [
                 "confidence",
@@ -72,11 +106,39 @@ class RobotAPI:
                 "target_dist",
                 "path",
                 "unfinished_path",
+                "current_map",
             ],
             "return_laser": False,
             "return_beams3D": False,
         }
+        self.push = PushSubscriber(host, self.keys["keys"], self.update_status)
+        self.poller = StatusPoller(self)
+        self.stations = StationMap(self.api_robot_status)
+        # thiết bị Modbus theo tên; board chính dùng cho LED/lift/stopper/conveyor/sensor
+        self.devices = {
+            name: Device(device, self.modbus.changes) for name, device in self.modbus.devices.items()
+        }
+        self.outputs = self.devices[MAIN_DEVICE].outputs
+        self.registers = self.devices[MAIN_DEVICE].registers
+        self.sensors = SensorPipeline(
+            self.devices[MAIN_DEVICE].registers.holding_block,
+            StatusRegister.sensor,
+            HOLDING.fields["sensor"].count,
+            period_s=SENSOR_SAMPLE_S,
+            filter=SensorFilter(SENSOR_FILTER, SENSOR_WINDOW),
+            on_change=self._publish_sensors,
+        )
         self.conveyor = {"type": Dir.stop, "height": 0.00}
+        self.conveyor_actions = {
+            "stop": Dir.stop,
+            "cw": Dir.cw_out,
+            "ccw": Dir.ccw_out,
+        }
+        self.led_colors = {
+            "red": Color.red,
+            "yellow": Color.yellow,
+            "green": Color.green,
+        }
         self.stopper_actions = {
             ("open", "cw"): Stopper.back_on,
             ("open", "ccw"): Stopper.front_on,
@@ -86,157 +148,295 @@ class RobotAPI:
             ("close", "all"): Stopper.all_off,
         }
 
+    @property
+    def data_status(self):
+        return self.snapshots.current().data
+
+    @data_status.setter
+    def data_status(self, value):
+        self.snapshots.publish(value)
+
     def connect_all(self):
-        self.api_robot_status.settimeout(10)
-        self.api_robot_status.connect((self.host, 19204))
-        self.api_robot_navigation.settimeout(10)
-        self.api_robot_navigation.connect((self.host, 19206))
-        self.api_robot_control.settimeout(10)
-        self.api_robot_control.connect((self.host, 19205))
+        if not self.connection.start():
+            logging.error("Robot connection not ready: " + str(self.connection.status()))
 
     def connect_status(self):
-        self.api_robot_status.settimeout(10)
-        self.api_robot_status.connect((self.host, 19204))
+        self.api_robot_status.connect()
 
     def connect_navigation(self):
-        self.api_robot_navigation.settimeout(10)
-        self.api_robot_navigation.connect((self.host, 19206))
+        self.api_robot_navigation.connect()
 
     def connect_control(self):
-        self.api_robot_control.settimeout(10)
-        self.api_robot_control.connect((self.host, 19205))
+        self.api_robot_control.connect()
 
     def navigation(self, json_string: dict):
-        result = tranmit.sendAPI(
-            self.api_robot_navigation, navigation.robot_task_go_target_req, json_string
+        result = self.api_robot_navigation.request(
+            navigation.robot_task_go_target_req, json_string
         )
         logging.info("Result's navigation: " + str(result))
+        return result
 
     def nav_cancel(self):
-        return tranmit.sendAPI(
-            self.api_robot_navigation, navigation.robot_task_cancel_req, {}
-        )
+        return self.api_robot_navigation.request(navigation.robot_task_cancel_req, {})
 
     def nav_pause(self):
-        return tranmit.sendAPI(
-            self.api_robot_navigation, navigation.robot_task_pause_req, {}
-        )
+        return self.api_robot_navigation.request(navigation.robot_task_pause_req, {})
 
     def nav_resume(self):
-        return tranmit.sendAPI(
-            self.api_robot_navigation, navigation.robot_task_resume_req, {}
+        return self.api_robot_navigation.request(navigation.robot_task_resume_req, {})
+
+    def target_path(self, target: str, source: str = ""):
+        msg = {"id": target}
+        if source:
+            msg["source_id"] = source
+        return self.api_robot_navigation.request(navigation.robot_task_target_path_req, msg)
+
+    def go_target_list(self, tasks: list):
+        return self.api_robot_navigation.request(
+            navigation.robot_task_gotargetlist_req, {"move_task_list": tasks}
+        )
+
+    def clear_target_list(self, task_ids: list = None):
+        return self.api_robot_navigation.request(
+            navigation.robot_task_cleartargetlist_req,
+            {"task_ids": task_ids} if task_ids else {},
         )
 
     def status(self):
-        self.data_status = tranmit.sendAPI(
-            self.api_robot_status, status.robot_status_all1_req, self.keys
+        self.data_status = self.api_robot_status.request(
+            status.robot_status_all1_req, self.keys
         )
 
+    def update_status(self, data: dict):
+        # Snapshot đã publish là bất biến: luôn tạo dict mới
+        with self._status_lock:
+            data_status = dict(self.data_status or {})
+            data_status.update(data)
+            self.data_status = data_status
+
     def confirm_local(self):
-        return tranmit.sendAPI(
-            self.api_robot_control, control.robot_control_comfirmloc_req, {}
-        )
+        return self.api_robot_control.request(control.robot_control_comfirmloc_req, {})
 
     def relocation(self, data_position: True):
-        return tranmit.sendAPI(
-            self.api_robot_control, control.robot_control_reloc_req, data_position
+        return self.api_robot_control.request(
+            control.robot_control_reloc_req, data_position
         )
 
     def control_conveyor(self, type: str):
-        if type == "stop":
-            modbus.datablock_input_register.setValues(address=0x05, values=Dir.stop)
-        elif type == "cw":
-            modbus.datablock_input_register.setValues(address=0x05, values=Dir.cw_out)
-        elif type == "ccw":
-            modbus.datablock_input_register.setValues(address=0x05, values=Dir.ccw_out)
-        else:
-            pass
+        value = self.conveyor_actions.get(type)
+        if value is not None:
+            self.outputs.write(OutputRegister.conveyor, value)
 
     def check_conveyor(self, type: str):
+        conveyor = self.registers.current().holding["conveyor"]
         if type == "cw":
-            return (
-                modbus.datablock_holding_register.getValues(address=0x04, count=1)[0]
-                == Dir.cw_out
-            )
+            return conveyor == Dir.cw_out
         elif type == "ccw":
-            return (
-                modbus.datablock_holding_register.getValues(address=0x04, count=1)[0]
-                == Dir.ccw_out
-            )
+            return conveyor == Dir.ccw_out
         elif type == "stop":
-            return (
-                modbus.datablock_holding_register.getValues(address=0x04, count=1)[0]
-                == Dir.stop
-            )
+            return conveyor == Dir.stop
         print("Truyền sai hành động!!!")
         return False
 
-    def control_stopper(self, data):
+    def stopper_value(self, data):
         status = data["status"]
 
         if status == "true":
-            action_value = Stopper.all_on
+            return Stopper.all_on
         elif status == "false":
-            action_value = Stopper.all_off
-        else:
-            action = data["action"]
-            action_value = self.stopper_actions.get((status, action))
+            return Stopper.all_off
+        return self.stopper_actions.get((status, data["action"]))
+
+    def control_stopper(self, data):
+        action_value = self.stopper_value(data)
         if action_value is not None:
-            modbus.datablock_input_register.setValues(
-                address=0x04, values=[action_value]
-            )
-        else:
-            pass
+            self.outputs.write(OutputRegister.stopper, action_value)
 
     def check_stopper(self, status, action):
         action_value = self.stopper_actions.get((status, action))
         if action_value is not None:
-            return (
-                modbus.datablock_holding_register.getValues(address=0x03, count=1)[0]
-                == action_value
-            )
+            return self.registers.current().holding["stopper"] == action_value
 
     def control_lift(self, height: int):
         try:
-            modbus.datablock_input_register.setValues(address=0x03, values=[height])
+            self.outputs.write(OutputRegister.lift, height)
             return {"result": True}
         except Exception as E:
             return {"result": False}
 
     def check_conveyor_height(self, height: int):
-        return (
-            modbus.datablock_holding_register.getValues(address=0x02, count=1)[0]
-            == height
-        )
+        return self.registers.current().holding["lift"] == height
 
     def check_robot_location(self, location: str):
-        if self.data_status["task_status"] == 4:
-            if (self.data_status["current_station"]) == location:
+        # data_status có thể chưa có field robot (robot offline, mới có sensor)
+        data = self.data_status or {}
+        if data.get("task_status") == 4:
+            if data.get("current_station") == location:
                 return True
         return False
 
     def check_sensor(self):
-        return modbus.datablock_holding_register.getValues(address=0x0A, count=10)
+        return self.registers.current().holding["sensor"]
+
+    def sensor_status(self) -> dict:
+        """
+        Field cảm biến của data_status cho SENSOR_CHANNELS: sensor (thanh ghi thô,
+        giữ nguyên như trước), sensor_stable (0/1 sau bộ lọc) và sensor_edge_ms.
+        """
+        sensor = self.check_sensor()
+        fields = self._sensor_fields(self.sensors.stable(), self.sensors.edge_ms())
+        fields["sensor"] = [sensor[i] for i in SENSOR_CHANNELS]
+        return fields
+
+    def _publish_sensors(self, stable: list, edge_ms: list):
+        # gọi từ thread lấy mẫu ngay khi có cạnh, không chờ tick get_status
+        self.update_status(self._sensor_fields(stable, edge_ms))
+
+    @staticmethod
+    def _sensor_fields(stable: list, edge_ms: list) -> dict:
+        return {
+            "sensor_stable": [stable[i] for i in SENSOR_CHANNELS],
+            "sensor_edge_ms": [edge_ms[i] for i in SENSOR_CHANNELS],
+        }
+
+    def device(self, name: str) -> Device:
+        device = self.devices.get(name)
+        if device is None:
+            raise DeviceError(f"không có thiết bị {name}")
+        return device
+
+    def read_registers(self, kind: str, address: int, count: int = 1, device: str = MAIN_DEVICE):
+        """Đọc thanh ghi Modbus từ snapshot: kind "hr" (holding, PLC ghi) hoặc "ir" (input, AMR ghi)."""
+        return self.device(device).read(kind, address, count)
+
+    def read_devices(self, names=None) -> dict:
+        """Snapshot thanh ghi của nhiều thiết bị, mỗi thiết bị một lần đọc mỗi block."""
+        names = list(self.devices) if names is None else names
+        return {name: self.device(name).snapshot().as_dict() for name in names}
+
+    def write_devices(self, writes: dict) -> dict:
+        """
+        Ghi {tên thiết bị: {field hoặc địa chỉ: giá trị}}: kiểm tra hết trước khi
+        ghi, rồi mỗi slave một lượt ghi gộp. Trả về các đoạn đã setValues theo thiết bị.
+        """
+        resolved = {name: self.device(name).resolve(values) for name, values in writes.items()}
+        return {
+            name: self.devices[name].outputs.write_many(values, flush=True)
+            for name, values in resolved.items()
+        }
 
     def set_led(self, color: str):
-        if color == "red":
-            modbus.datablock_input_register.setValues(1, Color.red)
-        elif color == "yellow":
-            modbus.datablock_input_register.setValues(1, Color.yellow)
-        elif color == "green":
-            modbus.datablock_input_register.setValues(1, Color.green)
+        value = self.led_colors.get(color)
+        if value is not None:
+            self.outputs.write(OutputRegister.led, value)
         else:
             print("Color error")
 
+    def write_outputs(self, writes: dict):
+        """Ghi ngay nhiều thanh ghi output {address: value}; các địa chỉ liền nhau gộp thành một setValues."""
+        return self.outputs.write_many(writes, flush=True)
+
     def monitor(self, data: dict):
-        return tranmit.sendAPI(
-            self.api_robot_control, control.robot_control_motion_req, data
-        )
+        return self.api_robot_control.request(control.robot_control_motion_req, data)
 
     def change_emergency(self, status):
         if status == "true":
-            self.data_status["emergency"] = True
+            self.update_status({"emergency": True})
             return {"result": True, "status": status}
         elif status == "false":
-            self.data_status["emergency"] = False
+            self.update_status({"emergency": False})
             return {"result": False, "status": status}
+
+
+class AsyncRobotAPI:
+    """
+    Phiên bản async của RobotAPI cho các handler FastAPI.
+
+    Dùng chung RobotChannel với RobotAPI (một kết nối mỗi port) nhưng chờ
+    reply bằng await thay vì chặn thread, nên một reply chậm của robot
+    không làm treo event loop. Các hàm Modbus/đọc dữ liệu cục bộ được
+    chuyển thẳng cho RobotAPI.
+    """
+
+    def __init__(self, robot: RobotAPI):
+        self.robot = robot
+
+    def __getattr__(self, name):
+        return getattr(self.robot, name)
+
+    async def _request(self, channel: RobotChannel, msgType: int, msg: dict):
+        with tracing.span("robot", {"port": channel.port, "code": msgType}):
+            fut = channel.submit(msgType, msg)
+            try:
+                return await asyncio.wait_for(asyncio.wrap_future(fut), channel.timeout_s)
+            except asyncio.TimeoutError:
+                channel.expire(fut, msgType)
+                return None
+            except Exception:
+                return None
+
+    async def navigation(self, json_string: dict):
+        result = await self._request(
+            self.robot.api_robot_navigation,
+            navigation.robot_task_go_target_req,
+            json_string,
+        )
+        logging.info("Result's navigation: " + str(result))
+        return result
+
+    async def nav_cancel(self):
+        return await self._request(
+            self.robot.api_robot_navigation, navigation.robot_task_cancel_req, {}
+        )
+
+    async def nav_pause(self):
+        return await self._request(
+            self.robot.api_robot_navigation, navigation.robot_task_pause_req, {}
+        )
+
+    async def nav_resume(self):
+        return await self._request(
+            self.robot.api_robot_navigation, navigation.robot_task_resume_req, {}
+        )
+
+    async def target_path(self, target: str, source: str = ""):
+        msg = {"id": target}
+        if source:
+            msg["source_id"] = source
+        return await self._request(
+            self.robot.api_robot_navigation, navigation.robot_task_target_path_req, msg
+        )
+
+    async def go_target_list(self, tasks: list):
+        return await self._request(
+            self.robot.api_robot_navigation,
+            navigation.robot_task_gotargetlist_req,
+            {"move_task_list": tasks},
+        )
+
+    async def clear_target_list(self, task_ids: list = None):
+        return await self._request(
+            self.robot.api_robot_navigation,
+            navigation.robot_task_cleartargetlist_req,
+            {"task_ids": task_ids} if task_ids else {},
+        )
+
+    async def status(self):
+        self.robot.data_status = await self._request(
+            self.robot.api_robot_status, status.robot_status_all1_req, self.robot.keys
+        )
+
+    async def confirm_local(self):
+        return await self._request(
+            self.robot.api_robot_control, control.robot_control_comfirmloc_req, {}
+        )
+
+    async def relocation(self, data_position: dict):
+        return await self._request(
+            self.robot.api_robot_control, control.robot_control_reloc_req, data_position
+        )
+
+    async def monitor(self, data: dict):
+        return await self._request(
+            self.robot.api_robot_control, control.robot_control_motion_req, data
+        )
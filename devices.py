@@ -0,0 +1,72 @@
+from typing import Any, Dict, List, Tuple, Union
+
+from outputs import OutputRegisters
+from registers import RegisterSnapshot, RegisterStore
+
+JsonDict = Dict[str, Any]
+Key = Union[str, int]
+
+
+class DeviceError(ValueError):
+    pass
+
+
+class Device:
+    """
+    Một slave Modbus theo tên (config.MODBUS_DEVICES).
+
+    Đọc qua RegisterStore riêng: một getValues mỗi block cho mọi lần đọc
+    trong cùng snapshot. Ghi qua OutputRegisters riêng: bỏ ghi trùng, gộp các
+    địa chỉ liền nhau của slave thành một setValues. Thêm board chỉ thêm một
+    Device, không thêm chi phí cho request tới board khác.
+    """
+
+    def __init__(self, device, notifier=None) -> None:
+        self.name = device.name
+        self.slave = device.slave
+        self.layout = device.layout
+        self.registers = RegisterStore(device.holding, device.input, notifier=notifier, layout=device.layout)
+        self.outputs = OutputRegisters(device.input)
+
+    def snapshot(self) -> RegisterSnapshot:
+        return self.registers.current()
+
+    def read(self, kind: str, address: int, count: int = 1) -> List[int]:
+        """Đọc thanh ghi từ snapshot: kind "hr" (holding) hoặc "ir" (input)."""
+        snapshot = self.registers.current()
+        block = snapshot.hr if kind == "hr" else snapshot.ir
+        return list(block[address:address + count])
+
+    def resolve(self, writes: Dict[Key, Any]) -> Dict[int, int]:
+        """
+        Đổi {field hoặc địa chỉ: giá trị} của block input thành {địa chỉ: giá trị}.
+        Field nhiều thanh ghi nhận list đủ count giá trị. Sai thì DeviceError.
+        """
+        input_map = self.layout.input
+        resolved: Dict[int, int] = {}
+        for key, value in writes.items():
+            if isinstance(key, str) and not key.isdigit():
+                field = input_map.fields.get(key)
+                if field is None:
+                    raise DeviceError(f"{self.name}: không có field {key}")
+                values = value if isinstance(value, list) else [value]
+                if len(values) != field.count:
+                    raise DeviceError(f"{self.name}.{key}: cần {field.count} giá trị")
+                for offset, v in enumerate(values):
+                    resolved[field.address + offset] = v
+                continue
+            address = int(key)
+            if not 0 <= address < input_map.size:
+                raise DeviceError(f"{self.name}: địa chỉ {address} ngoài block input (0..{input_map.size - 1})")
+            resolved[address] = value
+        for address, value in resolved.items():
+            if not isinstance(value, int) or isinstance(value, bool) or not 0 <= value <= 0xFFFF:
+                raise DeviceError(f"{self.name}: giá trị tại {address} phải là số 0..65535")
+        return resolved
+
+    def write(self, writes: Dict[Key, Any], *, flush: bool = True) -> List[Tuple[int, List[int]]]:
+        return self.outputs.write_many(self.resolve(writes), flush=flush)
+
+    def as_dict(self) -> JsonDict:
+        return dict(self.layout.as_dict(), registers=self.registers.current().as_dict())
+
@@ -1,53 +1,118 @@
-import json
 import struct
 import socket
 import logging
+import threading
+from typing import Optional
+
+import json_codec
 
 PACK_FMT_STR = '!BBHLH6s'
 
-class frame:
-    def creat(reqId, msgType, msg={}):
-        msgLen = 0
-        jsonStr = json.dumps(msg)
-        if (msg != {}):
-            msgLen = len(jsonStr)
-        rawMsg = struct.pack(PACK_FMT_STR, 0x5A, 0x01, reqId, msgLen,msgType, b'\x00\x00\x00\x00\x00\x00')
-
-        if (msg != {}):
-            rawMsg += bytearray(jsonStr,'ascii')
-        return rawMsg
-class tranmit:
-    def sendAPI(headerAPI:socket.socket,code_api:int,jsonstring:dict):
+HEADER = struct.Struct(PACK_FMT_STR)
+HEADER_SIZE = HEADER.size
+_RESERVED = b'\x00\x00\x00\x00\x00\x00'
+
+
+class FrameCodec:
+    """
+    Encode/decode frame theo PACK_FMT_STR.
+
+    Header dùng struct.Struct biên dịch sẵn, body được recv_into vào một
+    buffer cấp phát trước (tự nới rộng khi gói lớn hơn) qua memoryview nên
+    không phải nối bytes từng đoạn. JSON đi qua json_codec. Mỗi codec giữ
+    buffer riêng: không dùng chung một codec giữa nhiều thread cùng lúc.
+    """
+
+    def __init__(self, initial_size: int = 4096) -> None:
+        self._head = bytearray(HEADER_SIZE)
+        self._head_view = memoryview(self._head)
+        self._buf = bytearray(initial_size)
+        self._view = memoryview(self._buf)
+
+    @staticmethod
+    def encode(reqId: int, msgType: int, msg: Optional[dict] = None) -> bytes:
+        body = b''
+        if msg is not None and msg != {}:
+            body = json_codec.dumps(msg)
+        return HEADER.pack(0x5A, 0x01, reqId, len(body), msgType, _RESERVED) + body
+
+    def _reserve(self, size: int) -> memoryview:
+        if size > len(self._buf):
+            new_size = len(self._buf)
+            while new_size < size:
+                new_size *= 2
+            self._view.release()
+            self._buf = bytearray(new_size)
+            self._view = memoryview(self._buf)
+        return self._view
+
+    @staticmethod
+    def _recv_exact(sock: socket.socket, view: memoryview, size: int) -> int:
+        got = 0
+        while got < size:
+            n = sock.recv_into(view[got:size])
+            if n == 0:
+                break
+            got += n
+        return got
+
+    def read_header(self, sock: socket.socket) -> Optional[tuple]:
+        """Đọc đủ 16 byte header, trả về tuple đã unpack hoặc None nếu thiếu."""
+        if self._recv_exact(sock, self._head_view, HEADER_SIZE) < HEADER_SIZE:
+            return None
+        return HEADER.unpack(self._head)
+
+    def read_body(self, sock: socket.socket, size: int) -> memoryview:
+        """Đọc đúng `size` byte body vào buffer nội bộ, trả về view lên phần đã đọc."""
+        view = self._reserve(size)
+        got = self._recv_exact(sock, view, size)
+        if got < size:
+            raise ConnectionError("connection closed while reading body")
+        return view[:size]
+
+    @staticmethod
+    def decode(body: memoryview):
+        return json_codec.loads(body)
+
+    def request(self, sock: socket.socket, msgType: int, msg: Optional[dict], reqId: int = 1):
         try:
-            headerAPI.send(frame.creat(1,code_api,jsonstring))
+            sock.sendall(self.encode(reqId, msgType, msg))
         except socket.error:
             logging.error("SEND FRAME TO AMR ERROR")
             return None
-        dataall = b''
-        data = b''
-        try:    
-            data = headerAPI.recv(16)
+        try:
+            header = self.read_header(sock)
         except socket.timeout:
             logging.error("TIME OUT RECT FRAME TO AMR")
             return None
-        if(len(data) < 16):
+        except socket.error:
+            logging.error("PACK HEAD ERROR")
+            return None
+        if header is None:
             logging.error("PACK HEAD ERROR")
             return None
-        else:
-            header = struct.unpack(PACK_FMT_STR, data)
-            jsonDataLen = header[3]
-            backReqNum = header[4]
-        dataall += data
-        data = b''
-        readSize = 1024
         try:
-            while (jsonDataLen > 0):
-                recv = headerAPI.recv(readSize)
-                data += recv
-                jsonDataLen -= len(recv)
-                if jsonDataLen < readSize:
-                    readSize = jsonDataLen
-            data = json.loads(data)
-            return data
-        except Exception as e:
+            body = self.read_body(sock, header[3])
+            return self.decode(body)
+        except Exception:
             return None
+
+
+_local = threading.local()
+
+
+def _thread_codec() -> FrameCodec:
+    codec = getattr(_local, 'codec', None)
+    if codec is None:
+        codec = _local.codec = FrameCodec()
+    return codec
+
+
+class frame:
+    def creat(reqId, msgType, msg={}):
+        return _thread_codec().encode(reqId, msgType, msg)
+
+
+class tranmit:
+    def sendAPI(headerAPI: socket.socket, code_api: int, jsonstring: dict):
+        return _thread_codec().request(headerAPI, code_api, jsonstring)
@@ -0,0 +1,187 @@
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from registers import HOLDING, INPUT, RegisterSnapshot
+
+JsonDict = Dict[str, Any]
+
+# Cột của mỗi mẫu: holding register 0..HOLDING.size-1 rồi input register
+BLOCKS: Dict[str, Tuple[int, int]] = {
+    "hr": (0, HOLDING.size),
+    "ir": (HOLDING.size, INPUT.size),
+}
+WIDTH = HOLDING.size + INPUT.size
+
+
+class HistoryError(ValueError):
+    pass
+
+
+class RegisterHistory:
+    """
+    Ring buffer numpy cấp phát sẵn lưu lịch sử hai block thanh ghi.
+
+    Mỗi mẫu là (ts_ms, WIDTH giá trị uint16). Chỉ ghi mẫu khi snapshot có
+    version mới (giá trị đổi) nên bộ nhớ cố định (capacity * (8 + 2 * WIDTH)
+    byte, 64 MB cho 500k mẫu: ~3 ngày kể cả khi thanh ghi đổi mỗi tick 0.5 s).
+    Giá trị giữa hai mẫu là giá trị của mẫu trước (hàm bậc thang), nên mean
+    là trung bình theo thời gian.
+
+    record() gọi từ vòng get_status; các truy vấn chỉ chép phần cửa sổ cần
+    dùng ra khỏi khóa rồi tính vector hóa.
+    """
+
+    def __init__(self, capacity: int = 500_000) -> None:
+        if capacity < 2:
+            raise ValueError("capacity phải >= 2")
+        self.capacity = capacity
+        self._ts = np.zeros(capacity, dtype=np.int64)
+        self._values = np.zeros((capacity, WIDTH), dtype=np.uint16)
+        self._head = 0
+        self._count = 0
+        self._last_version = 0
+        self._newest_ms = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def record(self, snapshot: RegisterSnapshot) -> bool:
+        """Ghi snapshot nếu khác mẫu trước; trả về True nếu đã ghi."""
+        if snapshot.version == self._last_version:
+            return False
+        with self._lock:
+            self._last_version = snapshot.version
+            head = self._head
+            # giữ ts tăng dần cho searchsorted kể cả khi đồng hồ hệ thống lùi
+            self._newest_ms = max(snapshot.ts_ms, self._newest_ms)
+            self._ts[head] = self._newest_ms
+            row = self._values[head]
+            row[:HOLDING.size] = snapshot.hr
+            row[HOLDING.size:] = snapshot.ir
+            self._head = (head + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+        return True
+
+    def _window(self, start_ms: int, end_ms: int, columns: slice) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Chép các mẫu có ts trong [start_ms, end_ms] theo thứ tự thời gian, kèm
+        mẫu cuối cùng trước start_ms (giá trị đang có hiệu lực lúc start_ms).
+        """
+        with self._lock:
+            count = self._count
+            if count == 0:
+                return np.empty(0, dtype=np.int64), np.empty((0, columns.stop - columns.start), dtype=np.uint16)
+            first = (self._head - count) % self.capacity
+            if first + count <= self.capacity:
+                ts = self._ts[first:first + count]
+            else:
+                ts = np.concatenate((self._ts[first:], self._ts[:self._head]))
+            lo = max(int(np.searchsorted(ts, start_ms, side="right")) - 1, 0)
+            hi = int(np.searchsorted(ts, end_ms, side="right"))
+            rows = (first + np.arange(lo, hi)) % self.capacity
+            return ts[lo:hi].copy(), self._values[rows, columns]
+
+    def query(
+        self,
+        start_ms: int,
+        end_ms: int,
+        *,
+        kind: str = "hr",
+        address: int = 0,
+        count: Optional[int] = None,
+        at_ms: Optional[int] = None,
+        max_edges: int = 1000,
+    ) -> JsonDict:
+        """
+        Truy vấn cửa sổ [start_ms, end_ms] cho kind ("hr"/"ir") từ address,
+        count thanh ghi: thống kê min/max/mean, các cạnh (thanh ghi đổi giá
+        trị) và giá trị tại at_ms nếu có.
+        """
+        if kind not in BLOCKS:
+            raise HistoryError(f"kind phải là một trong {sorted(BLOCKS)}")
+        offset, size = BLOCKS[kind]
+        if count is None:
+            count = size - address
+        if address < 0 or count <= 0 or address + count > size:
+            raise HistoryError(f"dải địa chỉ ngoài block {kind} (0..{size - 1})")
+        if end_ms < start_ms:
+            raise HistoryError("end_ms phải >= start_ms")
+        columns = slice(offset + address, offset + address + count)
+
+        ts, values = self._window(start_ms, end_ms, columns)
+        result: JsonDict = {
+            "kind": kind,
+            "address": address,
+            "count": count,
+            "start_ms": start_ms,
+            "end_ms": end_ms,
+            "samples": int(len(ts)),
+            "stats": _stats(ts, values, start_ms, end_ms),
+            "edges": _edges(ts, values, address, max_edges),
+        }
+        if at_ms is not None:
+            result["at"] = self.at(at_ms, kind=kind, address=address, count=count)
+        return result
+
+    def at(self, at_ms: int, *, kind: str = "hr", address: int = 0, count: int = 1) -> Optional[JsonDict]:
+        """Giá trị đang có hiệu lực tại at_ms (mẫu gần nhất không sau at_ms)."""
+        offset, _ = BLOCKS[kind]
+        ts, values = self._window(at_ms, at_ms, slice(offset + address, offset + address + count))
+        valid = np.nonzero(ts <= at_ms)[0]
+        if not len(valid):
+            return None
+        i = valid[-1]
+        return {"ts_ms": int(ts[i]), "values": values[i].tolist()}
+
+    def info(self) -> JsonDict:
+        with self._lock:
+            count = self._count
+            first = (self._head - count) % self.capacity
+            oldest = int(self._ts[first]) if count else None
+            newest = int(self._ts[self._head - 1]) if count else None
+        return {
+            "capacity": self.capacity,
+            "samples": count,
+            "oldest_ms": oldest,
+            "newest_ms": newest,
+            "bytes": int(self._ts.nbytes + self._values.nbytes),
+        }
+
+
+def _stats(ts: np.ndarray, values: np.ndarray, start_ms: int, end_ms: int) -> Optional[JsonDict]:
+    if not len(ts) or ts[0] > end_ms:
+        return None
+    # mỗi mẫu có hiệu lực từ ts của nó tới ts mẫu sau, cắt theo cửa sổ
+    begin = np.maximum(ts, start_ms)
+    finish = np.append(ts[1:], end_ms)
+    weights = np.clip(finish - begin, 0, None).astype(np.float64)
+    data = values.astype(np.float64)
+    total = weights.sum()
+    if total > 0:
+        mean = weights @ data / total
+    else:
+        mean = data[-1]
+    return {
+        "min": values.min(axis=0).tolist(),
+        "max": values.max(axis=0).tolist(),
+        "mean": np.round(mean, 4).tolist(),
+    }
+
+
+def _edges(ts: np.ndarray, values: np.ndarray, address: int, max_edges: int) -> JsonDict:
+    if len(ts) < 2:
+        return {"total": 0, "counts": [0] * values.shape[1], "items": []}
+    changed = values[1:] != values[:-1]
+    counts = changed.sum(axis=0)
+    rows, cols = np.nonzero(changed)
+    # rows[-0:] là cả mảng: max_edges <= 0 nghĩa là không lấy cạnh nào
+    keep = max(max_edges, 0)
+    # mẫu đầu có thể nằm trước cửa sổ; cạnh vẫn tính vì mẫu sau nằm trong cửa sổ
+    items: List[JsonDict] = [
+        {"ts_ms": int(ts[r + 1]), "address": address + int(c), "from": int(values[r, c]), "to": int(values[r + 1, c])}
+        for r, c in zip(rows[len(rows) - keep:].tolist(), cols[len(cols) - keep:].tolist())
+    ]
+    return {"total": int(len(rows)), "counts": counts.tolist(), "items": items}
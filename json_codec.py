@@ -0,0 +1,65 @@
+"""
+JSON encode/decode dùng chung cho frame robot, socket server và HTTP.
+
+Dùng orjson nếu đã cài, sau đó tới msgspec, cuối cùng là json chuẩn.
+dumps() luôn trả bytes UTF-8 dạng gọn (không khoảng trắng); loads() nhận
+bytes, bytearray, memoryview hoặc str.
+"""
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+Buffer = Union[bytes, bytearray, memoryview, str]
+
+
+def _std_dumps(obj: Any) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _std_loads(data: Buffer) -> Any:
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return json.loads(data)
+
+
+if orjson is not None:
+    BACKEND = "orjson"
+    DecodeError = orjson.JSONDecodeError
+
+    def dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+    loads = orjson.loads
+elif msgspec is not None:
+    BACKEND = "msgspec"
+    DecodeError = (msgspec.DecodeError, ValueError)
+    dumps = msgspec.json.Encoder().encode
+    loads = msgspec.json.Decoder().decode
+else:
+    BACKEND = "json"
+    DecodeError = ValueError
+    dumps = _std_dumps
+    loads = _std_loads
+
+
+try:
+    from fastapi.responses import JSONResponse
+except ImportError:
+    JSONResponse = None
+
+if JSONResponse is not None:
+
+    class CodecJSONResponse(JSONResponse):
+        """JSONResponse render bằng dumps() của module này."""
+
+        def render(self, content: Any) -> bytes:
+            return dumps(content)
@@ -1,8 +1,8 @@
 from threading import Thread
-from control import modbus
-from config import APP_HOST, APP_PORT
+from config import APP_HOST, APP_PORT, MODBUS_TCP_ENABLED, MODBUS_TCP_HOST, MODBUS_TCP_PORT
+from metrics import STATUS_LOOP_JITTER, STATUS_LOOP_PERIOD
 import uvicorn
-from app import app, control
+from app import app, control, register_history
 import asyncio
 import time
 
@@ -12,26 +12,47 @@ def run_app():
 
 
 def get_status():
+    last = None
+    planned = 0.0
     while True:
-        control.status()
-        if control.data_status:
-            if control.data_status["blocked"] or control.data_status["emergency"]:
+        now = time.perf_counter()
+        if last is not None:
+            STATUS_LOOP_PERIOD.observe(now - last)
+            STATUS_LOOP_JITTER.observe(now - last - planned)
+        last = now
+        # một snapshot thanh ghi cho cả tick: LED, sensor, HTTP GET và điều kiện chờ dùng chung
+        register_history.record(control.registers.refresh())
+        # Chỉ poll khi push không còn cập nhật (robot không hỗ trợ/mất kết nối push)
+        pushing = control.push.fresh()
+        if not pushing:
+            control.poller.poll()
+        # robot offline lúc khởi động: data_status chỉ có field sensor, chưa có field robot
+        data = control.data_status
+        if data:
+            control.stations.check(data)
+            if data.get("blocked") or data.get("emergency"):
                 control.set_led("red")
             elif (
-                control.data_status["current_station"] == "LM101"
-                or control.data_status["battery_level"] < 0.2
+                data.get("current_station") == "LM101"
+                or data.get("battery_level", 1.0) < 0.2
             ):
                 control.set_led("yellow")
             else:
                 control.set_led("green")
-        sensor = control.check_sensor()
-        data_sensor = [sensor[5], sensor[6]]
-        control.data_status["sensor"] = data_sensor
-        time.sleep(0.5)
+        # sensor thô mỗi tick như trước; cạnh sensor_stable được publish ngay từ
+        # SensorPipeline, tick chỉ giữ lại các field này sau khi poll thay cả data_status
+        control.update_status(control.sensor_status())
+        planned = 0.5 if pushing else min(control.poller.sleep_time(), 0.5)
+        time.sleep(planned)
 
 
 if __name__ == "__main__":
     control.connect_all()
+    control.push.start()
+    control.sensors.start()
+    control.stations.refresh()
     Thread(target=run_app, args=()).start()
     Thread(target=get_status, args=()).start()
-    asyncio.run(modbus.run_server_serial())
+    if MODBUS_TCP_ENABLED:
+        control.modbus.start_tcp(MODBUS_TCP_HOST, MODBUS_TCP_PORT)
+    asyncio.run(control.modbus.run_server_serial())
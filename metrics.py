@@ -0,0 +1,254 @@
+import math
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Bucket mặc định (giây) cho round-trip robot và chu kỳ vòng status
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PERIOD_BUCKETS = (0.01, 0.025, 0.05, 0.075, 0.1, 0.15, 0.2, 0.3, 0.5, 0.75, 1.0, 2.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0
+
+    def inc(self, n: int = 1) -> None:
+        self.value += n
+
+
+class _GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, n: float = 1) -> None:
+        self.value += n
+
+    def dec(self, n: float = 1) -> None:
+        self.value -= n
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class _Metric:
+    """
+    Một họ metric có nhãn; labels(...) trả về child ghi trực tiếp.
+
+    Đường nóng nên giữ child (hoặc tra bằng labels() một lần) rồi chỉ gọi
+    inc/observe: không khóa, chỉ cộng số nguyên dưới GIL, nên có thể mất
+    vài lần đếm khi nhiều thread tranh nhau — chấp nhận được cho metrics.
+    """
+
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} cần nhãn {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def inc(self, n: int = 1) -> None:
+        self._children[()].inc(n)
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_labels(self.labelnames, key)} {_number(child.value)}"
+            for key, child in list(self._children.items())
+        ]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Iterable[str] = (),
+        *,
+        callback: Optional[Callable[[], float]] = None,
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.callback = callback
+
+    def _new_child(self) -> _GaugeChild:
+        return _GaugeChild()
+
+    def set(self, value: float) -> None:
+        self._children[()].set(value)
+
+    def inc(self, n: float = 1) -> None:
+        self._children[()].inc(n)
+
+    def dec(self, n: float = 1) -> None:
+        self._children[()].dec(n)
+
+    def _samples(self) -> List[str]:
+        if self.callback is not None:
+            return [f"{self.name} {_number(self.callback())}"]
+        return [
+            f"{self.name}{_labels(self.labelnames, key)} {_number(child.value)}"
+            for key, child in list(self._children.items())
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Iterable[str] = (),
+        *,
+        buckets: Iterable[float] = LATENCY_BUCKETS,
+    ) -> None:
+        self.bounds = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames)
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value: float) -> None:
+        self._children[()].observe(value)
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, child in list(self._children.items()):
+            counts = list(child.counts)
+            total = 0
+            for bound, count in zip(self.bounds + (math.inf,), counts):
+                total += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {total}")
+            labels = _labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_number(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {total}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+ROBOT_RTT = REGISTRY.register(
+    Histogram("amr_robot_rtt_seconds", "Round-trip request robot tới khi có reply", ("port", "code"))
+)
+ROBOT_TIMEOUTS = REGISTRY.register(
+    Counter("amr_robot_timeouts_total", "Request robot hết thời gian chờ reply", ("port", "code"))
+)
+ROBOT_HEAD_ERRORS = REGISTRY.register(
+    Counter("amr_robot_pack_head_errors_total", "Header reply robot thiếu/ngắn (PACK HEAD ERROR)", ("port",))
+)
+ROBOT_SEND_ERRORS = REGISTRY.register(
+    Counter("amr_robot_send_errors_total", "Lỗi gửi frame tới robot", ("port",))
+)
+ROBOT_DROPPED_REPLIES = REGISTRY.register(
+    Counter("amr_robot_dropped_replies_total", "Reply robot không còn request chờ (đã hết hạn)", ("port",))
+)
+ROBOT_BYTES = REGISTRY.register(
+    Counter("amr_robot_bytes_total", "Byte gửi/nhận trên kết nối robot", ("port", "direction"))
+)
+STATUS_LOOP_PERIOD = REGISTRY.register(
+    Histogram("amr_status_loop_period_seconds", "Chu kỳ thực của vòng get_status", buckets=PERIOD_BUCKETS)
+)
+STATUS_LOOP_JITTER = REGISTRY.register(
+    Histogram(
+        "amr_status_loop_jitter_seconds",
+        "Chu kỳ thực trừ thời gian sleep dự định của vòng get_status",
+        buckets=LATENCY_BUCKETS,
+    )
+)
+MODBUS_OPS = REGISTRY.register(
+    Counter("amr_modbus_register_ops_total", "Số lần đọc/ghi datablock Modbus", ("block", "op"))
+)
+MODBUS_REGISTERS = REGISTRY.register(
+    Counter("amr_modbus_registers_total", "Số thanh ghi Modbus đã đọc/ghi", ("block", "op"))
+)
+MODBUS_WRITES_SAVED = REGISTRY.register(
+    Counter("amr_modbus_writes_saved_total", "Lần ghi output Modbus được bỏ qua/gộp", ("reason",))
+)
+SOCKET_CLIENTS = REGISTRY.register(Gauge("amr_socket_clients", "Số client SocketServer đang kết nối"))
+SOCKET_BYTES = REGISTRY.register(
+    Counter("amr_socket_bytes_total", "Byte SocketServer nhận/gửi", ("direction",))
+)
@@ -0,0 +1,245 @@
+import asyncio
+import itertools
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from batch import BatchError, BatchRunner
+from control import AsyncRobotAPI, RobotAPI
+from waiting import wait_until
+
+JsonDict = Dict[str, Any]
+
+# task_status của robot: 5 FAILED, 6 CANCELED
+TASK_FAILED = (5, 6)
+DEFAULT_WAIT_TIMEOUT_S = 120.0
+
+
+class MissionState:
+    pending = "pending"
+    running = "running"
+    done = "done"
+    failed = "failed"
+    cancelled = "cancelled"
+
+
+@dataclass
+class StepRecord:
+    index: int
+    op: str
+    kind: str
+    state: str = MissionState.pending
+    result: Any = None
+    error: str = ""
+    started_at_ms: int = 0
+    elapsed_ms: float = 0.0
+
+
+@dataclass
+class Mission:
+    mission_id: str
+    steps: List[JsonDict]
+    records: List[StepRecord]
+    state: str = MissionState.pending
+    current: int = -1
+    created_at_ms: int = field(default_factory=lambda: int(time.time() * 1000))
+    elapsed_ms: float = 0.0
+    version: int = 0
+    changed: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+    task: Optional[asyncio.Task] = field(default=None, repr=False)
+
+    def touch(self) -> None:
+        self.version += 1
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    def as_dict(self) -> JsonDict:
+        breakdown: Dict[str, float] = {}
+        for rec in self.records:
+            breakdown[rec.kind] = breakdown.get(rec.kind, 0.0) + rec.elapsed_ms
+        return {
+            "id": self.mission_id,
+            "state": self.state,
+            "version": self.version,
+            "current": self.current,
+            "elapsed_ms": self.elapsed_ms,
+            "breakdown_ms": breakdown,
+            "steps": [
+                {
+                    "index": rec.index,
+                    "op": rec.op,
+                    "kind": rec.kind,
+                    "state": rec.state,
+                    "result": rec.result,
+                    "error": rec.error,
+                    "elapsed_ms": rec.elapsed_ms,
+                }
+                for rec in self.records
+            ],
+        }
+
+
+class MissionEngine:
+    """
+    Chạy mission khai báo phía server.
+
+    Bước thao tác dùng cùng op với POST /batch (navigation, conveyor,
+    stopper, lift, color, ...). Bước chờ (wait_arrived, wait_conveyor,
+    wait_stopper, wait_lift) không sleep cố định mà thức dậy theo snapshot
+    status mới; mỗi bước ghi lại thời gian để client xem phân bổ wall-time.
+    """
+
+    def __init__(
+        self,
+        robot: RobotAPI,
+        async_robot: AsyncRobotAPI,
+        runner: BatchRunner,
+        *,
+        keep_finished: int = 100,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        self.robot = robot
+        self.async_robot = async_robot
+        self.runner = runner
+        self.keep_finished = keep_finished
+        self.log = logger or logging.getLogger("mission")
+        self.missions: Dict[str, Mission] = {}
+        self._ids = itertools.count(1)
+        self.waits: Dict[str, Callable[[JsonDict, int], Tuple[Callable[[], bool], bool]]] = {
+            "wait_arrived": self._wait_arrived,
+            "wait_conveyor": lambda s, _: (lambda: self.robot.check_conveyor(s["type"]), True),
+            "wait_stopper": lambda s, _: (lambda: bool(self.robot.check_stopper(s["status"], s["action"])), True),
+            "wait_lift": lambda s, _: (lambda: self.robot.check_conveyor_height(s["height"]), True),
+        }
+
+    def _kind(self, op: Any) -> str:
+        if op in self.waits:
+            return "wait"
+        if op in ("navigation", "action", "relocation", "confirm", "monitor"):
+            return "robot"
+        return "io"
+
+    def validate(self, steps: List[JsonDict]) -> None:
+        if not isinstance(steps, list) or not steps:
+            raise BatchError("mission cần danh sách bước không rỗng")
+        for index, step in enumerate(steps):
+            op = step.get("op") if isinstance(step, dict) else None
+            if op not in self.waits and not self.runner.supports(op):
+                raise BatchError(f"bước {index}: op không hợp lệ: {op}")
+            # check_stopper trả None với cặp sai: bước sẽ chờ tới hết timeout
+            if op == "wait_stopper" and (step.get("status"), step.get("action")) not in self.robot.stopper_actions:
+                raise BatchError(f"bước {index}: stopper không hợp lệ: {step.get('status')}/{step.get('action')}")
+
+    def start(self, steps: List[JsonDict]) -> Mission:
+        self.validate(steps)
+        mission_id = str(next(self._ids))
+        records = [StepRecord(i, step["op"], self._kind(step["op"])) for i, step in enumerate(steps)]
+        mission = Mission(mission_id, steps, records)
+        self.missions[mission_id] = mission
+        self._prune()
+        mission.task = asyncio.create_task(self._run(mission))
+        return mission
+
+    def get(self, mission_id: str) -> Optional[Mission]:
+        return self.missions.get(mission_id)
+
+    async def cancel(self, mission_id: str) -> Optional[Mission]:
+        mission = self.missions.get(mission_id)
+        if mission is None or mission.task is None or mission.task.done():
+            return mission
+        mission.task.cancel()
+        try:
+            await mission.task
+        except asyncio.CancelledError:
+            pass
+        return mission
+
+    async def wait_change(self, mission: Mission, since: int, timeout_s: float) -> Mission:
+        """Chờ tới khi mission có version > since hoặc hết timeout_s."""
+        deadline = time.monotonic() + timeout_s
+        while mission.version <= since:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(mission.changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+        return mission
+
+    def _prune(self) -> None:
+        finished = [
+            m for m in self.missions.values()
+            if m.state not in (MissionState.pending, MissionState.running)
+        ]
+        for mission in finished[: max(len(finished) - self.keep_finished, 0)]:
+            del self.missions[mission.mission_id]
+
+    def _wait_arrived(self, step: JsonDict, since_version: int) -> Tuple[Callable[[], bool], bool]:
+        location = step["location"]
+
+        def arrived() -> bool:
+            snapshot = self.robot.snapshots.current()
+            data = snapshot.data or {}
+            if (
+                snapshot.version > since_version
+                and data.get("task_status") in TASK_FAILED
+                and data.get("target_id") == location
+            ):
+                raise BatchError(f"robot không tới được {location} (task_status={data['task_status']})")
+            return self.robot.check_robot_location(location) if data else False
+
+        return arrived, False
+
+    async def _run(self, mission: Mission) -> None:
+        started = time.perf_counter()
+        mission.state = MissionState.running
+        mission.touch()
+        navigating = False
+        nav_version = 0
+        try:
+            for index, step in enumerate(mission.steps):
+                rec = mission.records[index]
+                mission.current = index
+                rec.state = MissionState.running
+                rec.started_at_ms = int(time.time() * 1000)
+                mission.touch()
+                t0 = time.perf_counter()
+                try:
+                    if step["op"] in self.waits:
+                        predicate, registers = self.waits[step["op"]](step, nav_version)
+                        timeout_s = float(step.get("timeout", DEFAULT_WAIT_TIMEOUT_S))
+                        notifier = self.robot.registers.notifier if registers else None
+                        if not await wait_until(self.robot.snapshots, predicate, timeout_s, registers=notifier):
+                            raise BatchError(f"hết thời gian chờ {step['op']} sau {timeout_s} s")
+                        rec.result = True
+                        if step["op"] == "wait_arrived":
+                            navigating = False
+                    else:
+                        if step["op"] == "navigation":
+                            nav_version = self.robot.snapshots.current().version
+                            navigating = True
+                        # lệnh robot không có reply hoặc ret_code != 0 ném BatchError: bước
+                        # fail ngay thay vì để wait_arrived sau đó chờ tới hết timeout
+                        rec.result = await self.runner.execute(step)
+                    rec.state = MissionState.done
+                except (BatchError, KeyError, TypeError, ValueError) as exc:
+                    rec.state = MissionState.failed
+                    rec.error = str(exc) or type(exc).__name__
+                    mission.state = MissionState.failed
+                    return
+                finally:
+                    rec.elapsed_ms = (time.perf_counter() - t0) * 1000
+            mission.state = MissionState.done
+        except asyncio.CancelledError:
+            mission.state = MissionState.cancelled
+            for rec in mission.records:
+                if rec.state == MissionState.running:
+                    rec.state = MissionState.cancelled
+            if navigating:
+                await self.async_robot.nav_cancel()
+            raise
+        finally:
+            mission.elapsed_ms = (time.perf_counter() - started) * 1000
+            mission.touch()
@@ -1,24 +1,211 @@
+import asyncio
+import itertools
+import logging
+import threading
+from collections import deque
+from typing import Callable, Dict, Optional, Tuple
+
 from pymodbus.datastore import (
     ModbusSequentialDataBlock,
     ModbusServerContext,
     ModbusSlaveContext
 )
-from pymodbus.server import StartAsyncSerialServer
+from pymodbus.server import ModbusTcpServer, StartAsyncSerialServer
 
 from pymodbus import __version__ as pymodbus_version
 from pymodbus.device import ModbusDeviceIdentification
 from pymodbus.framer import ModbusRtuFramer
 
+from config import MODBUS_DEVICES, MODBUS_TCP_WRITE
+from metrics import MODBUS_OPS, MODBUS_REGISTERS
+from snapshot import Waiters
+from registers import MAIN_DEVICE, DeviceLayout, device_layouts
+
+
+class CountingDataBlock(ModbusSequentialDataBlock):
+    """Datablock đếm số lần và số thanh ghi đọc/ghi (cả từ app lẫn từ master RTU)."""
+
+    def __init__(self, name: str, address, values):
+        super().__init__(address, values)
+        self._reads = MODBUS_OPS.labels(name, "read")
+        self._writes = MODBUS_OPS.labels(name, "write")
+        self._read_regs = MODBUS_REGISTERS.labels(name, "read")
+        self._write_regs = MODBUS_REGISTERS.labels(name, "write")
+
+    def getValues(self, address, count=1):
+        self._reads.inc()
+        self._read_regs.inc(count)
+        return super().getValues(address, count)
+
+    def setValues(self, address, values):
+        self._writes.inc()
+        self._write_regs.inc(len(values) if isinstance(values, list) else 1)
+        super().setValues(address, values)
+
+
+class ChangeNotifier:
+    """
+    Phát sự kiện thay đổi thanh ghi từ các NotifyingDataBlock.
+
+    setValues chỉ ghi nhận thay đổi vào hàng đợi và bật một Event; thread
+    dispatch riêng mới tăng version, gọi callback theo dải địa chỉ và đánh
+    thức waiter (thread lẫn asyncio), nên đường trả lời RTU không gánh các
+    việc đó.
+    """
+
+    def __init__(self, logger: Optional[logging.Logger] = None) -> None:
+        self.log = logger or logging.getLogger("modbus_changes")
+        self.version = 0
+        self._changes: deque = deque()
+        self._signal = threading.Event()
+        self._waiters = Waiters()
+        self._subs: Dict[int, Tuple[str, int, int, Callable]] = {}
+        self._sub_ids = itertools.count(1)
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+
+    def push(self, block: str, address: int, count: int) -> None:
+        """Gọi từ setValues: chỉ xếp hàng, không chờ gì."""
+        self._changes.append((block, address, count))
+        if self._thread is None:
+            self._start()
+        self._signal.set()
+
+    def _start(self) -> None:
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._dispatch_loop, name="modbus_changes", daemon=True)
+                self._thread.start()
+
+    def subscribe(self, block: str, address: int, count: int, callback: Callable[[str, int, int, int], None]) -> int:
+        """
+        callback(block, address, count, version) được gọi (ở thread dispatch)
+        khi có ghi thay đổi giao với [address, address + count) của block.
+        """
+        token = next(self._sub_ids)
+        self._subs[token] = (block, address, address + count, callback)
+        return token
+
+    def unsubscribe(self, token: int) -> None:
+        self._subs.pop(token, None)
+
+    def wait(self, since: int, timeout_s: float) -> int:
+        """Chờ (chặn thread) tới khi version > since hoặc hết timeout_s; trả version hiện tại."""
+        self._waiters.wait(lambda: self.version > since, timeout_s)
+        return self.version
+
+    async def wait_async(self, since: int, timeout_s: float) -> int:
+        await self._waiters.wait_async(lambda: self.version > since, timeout_s)
+        return self.version
+
+    def _dispatch_loop(self) -> None:
+        while True:
+            self._signal.wait()
+            self._signal.clear()
+            changes = []
+            while self._changes:
+                changes.append(self._changes.popleft())
+            if not changes:
+                continue
+            with self._waiters.cond:
+                self.version += 1
+                version = self.version
+                waiters = self._waiters.release_locked()
+            Waiters.wake(waiters, version)
+            for block, address, count in changes:
+                end = address + count
+                for sub_block, start, stop, callback in list(self._subs.values()):
+                    if sub_block == block and start < end and address < stop:
+                        try:
+                            callback(block, address, count, version)
+                        except Exception:
+                            self.log.exception("Register change callback failed")
+
+
+class NotifyingDataBlock(CountingDataBlock):
+    """
+    Datablock ghi version theo từng thanh ghi và báo ChangeNotifier khi một
+    lần ghi thực sự đổi giá trị (ghi lại giá trị cũ không phát sự kiện).
+    """
+
+    def __init__(self, name: str, address, values, notifier: ChangeNotifier):
+        super().__init__(name, address, values)
+        self.name = name
+        self.notifier = notifier
+        self.versions = [0] * len(self.values)
+
+    def setValues(self, address, values):
+        if not isinstance(values, list):
+            values = [values]
+        start = address - self.address
+        end = start + len(values)
+        old = self.values[start:end]
+        super().setValues(address, values)
+        if old != values:
+            versions = self.versions
+            for i, (a, b) in enumerate(zip(old, values), start):
+                if a != b:
+                    versions[i] += 1
+            self.notifier.push(self.name, address, len(values))
+
+    def version_of(self, address: int, count: int = 1) -> int:
+        """Tổng version của dải địa chỉ; đổi khi bất kỳ thanh ghi nào trong dải đổi."""
+        start = address - self.address
+        return sum(self.versions[start:start + count])
+
+
+class ReadOnlySlaveContext(ModbusSlaveContext):
+    """
+    Slave context cho client Modbus TCP: các function ghi bị từ chối ở
+    validate (client nhận IllegalAddress), vì holding register do PLC trên
+    RTU làm chủ. Đọc dùng chung datablock với RTU.
+    """
+
+    WRITE_CODES = frozenset((5, 6, 15, 16, 22, 23))
+
+    def validate(self, fc_as_hex, address, count=1):
+        if fc_as_hex in self.WRITE_CODES:
+            return False
+        return super().validate(fc_as_hex, address, count)
+
+
+class ModbusDevice:
+    """Cặp datablock holding/input của một slave; tên block theo bản đồ thanh ghi."""
+
+    def __init__(self, layout: DeviceLayout, notifier: ChangeNotifier) -> None:
+        self.layout = layout
+        self.name = layout.name
+        self.slave = layout.slave
+        self.holding = NotifyingDataBlock(layout.holding.name, 0x00, [0] * layout.holding.size, notifier)
+        self.input = NotifyingDataBlock(layout.input.name, 0x00, [0] * layout.input.size, notifier)
+
+
 class ModbusServer():
-    def __init__(self) -> None:
-        self.datablock_holding_register = ModbusSequentialDataBlock(0x00, [0] * 30)
-        self.datablock_input_register = ModbusSequentialDataBlock(0x00, [0] * 30)
+    def __init__(self, layouts: Optional[Dict[str, DeviceLayout]] = None) -> None:
+        self.changes = ChangeNotifier()
+        if layouts is None:
+            layouts = device_layouts(MODBUS_DEVICES)
+        self.devices: Dict[str, ModbusDevice] = {
+            name: ModbusDevice(layout, self.changes) for name, layout in layouts.items()
+        }
+        main = self.devices[MAIN_DEVICE]
+        self.datablock_holding_register = main.holding
+        self.datablock_input_register = main.input
+        # mọi slave trên cùng một context
         self.context_serial = ModbusServerContext(slaves={
-                0x01: ModbusSlaveContext(
-                    hr=self.datablock_holding_register,
-                    ir=self.datablock_input_register,
-                ),
+                device.slave: ModbusSlaveContext(hr=device.holding, ir=device.input)
+                for device in self.devices.values()
             },single=False)
+        # TCP đọc cùng datablock; chỉ được ghi khi bật MODBUS_TCP_WRITE
+        if MODBUS_TCP_WRITE:
+            self.context_tcp = self.context_serial
+        else:
+            self.context_tcp = ModbusServerContext(slaves={
+                    device.slave: ReadOnlySlaveContext(hr=device.holding, ir=device.input)
+                    for device in self.devices.values()
+                },single=False)
+        self.tcp_server: Optional[ModbusTcpServer] = None
+        self._tcp_loop: Optional[asyncio.AbstractEventLoop] = None
     
     async def run_server_serial(self):
         print("run modbus server")
@@ -40,3 +227,30 @@ class ModbusServer():
         )
 
         # return server
+
+    async def run_server_tcp(self, host: str, port: int):
+        """Modbus TCP trên cùng datablock với server RTU (HMI, công cụ chẩn đoán)."""
+        print(f"run modbus tcp server {host}:{port}")
+        self._tcp_loop = asyncio.get_running_loop()
+        self.tcp_server = ModbusTcpServer(context=self.context_tcp, address=(host, port))
+        await self.tcp_server.serve_forever()
+
+    def start_tcp(self, host: str, port: int) -> threading.Thread:
+        """
+        Chạy server TCP trên thread và event loop riêng để nhiều client TCP
+        đọc dồn dập không chiếm event loop của server RTU.
+        """
+        thread = threading.Thread(
+            target=lambda: asyncio.run(self.run_server_tcp(host, port)),
+            name="modbus_tcp",
+            daemon=True,
+        )
+        thread.start()
+        return thread
+
+    def stop_tcp(self) -> None:
+        server, loop = self.tcp_server, self._tcp_loop
+        if server is None or loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(server.shutdown(), loop)
+        self.tcp_server = None
@@ -0,0 +1,292 @@
+import asyncio
+import itertools
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from control import AsyncRobotAPI, RobotAPI
+
+JsonDict = Dict[str, Any]
+
+# task_status của robot: 4 COMPLETED, 5 FAILED, 6 CANCELED
+TASK_COMPLETED = 4
+TASK_FAILED = (5, 6)
+
+
+class NavQueueError(Exception):
+    pass
+
+
+class LegState:
+    queued = "queued"
+    sent = "sent"
+    done = "done"
+    failed = "failed"
+    cancelled = "cancelled"
+
+
+@dataclass
+class Leg:
+    leg_id: str
+    target: str
+    source: str = ""
+    path: List[str] = field(default_factory=list)
+    task_ids: List[str] = field(default_factory=list)
+    state: str = LegState.queued
+    # đã thấy robot ở trạm khác target khi leg đang là leg đầu
+    departed: bool = False
+    created_at_ms: int = field(default_factory=lambda: int(time.time() * 1000))
+    finished_at_ms: int = 0
+
+    def as_dict(self) -> JsonDict:
+        return {
+            "id": self.leg_id,
+            "target": self.target,
+            "source": self.source,
+            "path": self.path,
+            "state": self.state,
+            "created_at_ms": self.created_at_ms,
+            "finished_at_ms": self.finished_at_ms,
+        }
+
+
+class NavQueue:
+    """
+    Hàng đợi nhiều đích navigation chạy liền mạch trên robot.
+
+    Mỗi leg được tách thành các đoạn trạm-kề-trạm theo path lấy bằng
+    target_path (3053, có cache theo (source, target)) rồi gửi cả hàng đợi
+    bằng gotargetlist (3066), nên robot đi tiếp leg sau mà không dừng chờ
+    client. Thêm, đổi thứ tự hay hủy các leg chưa chạy thì xóa phần đuôi trên
+    robot bằng cleartargetlist (3067) rồi gửi lại. Leg đầu (đang chạy) chỉ
+    hủy được, bằng nav_cancel (3003).
+
+    Tiến độ theo dõi bằng snapshot status: leg đầu xong khi robot rời đi rồi
+    tới current_station == target; task_status 5/6 ngoài ý muốn đánh dấu các
+    leg đã gửi là failed, các leg còn lại giữ trạng thái queued.
+    """
+
+    def __init__(
+        self,
+        robot: RobotAPI,
+        async_robot: AsyncRobotAPI,
+        *,
+        keep_finished: int = 50,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        self.robot = robot
+        self.async_robot = async_robot
+        self.log = logger or logging.getLogger("navqueue")
+        self.legs: List[Leg] = []
+        self.finished: Deque[Leg] = deque(maxlen=keep_finished)
+        self.paths: Dict[Tuple[str, str], List[str]] = {}
+        self._ids = itertools.count(1)
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        # nav_cancel do chính hàng đợi gửi: task_status 6 kế tiếp không phải lỗi
+        self._expect_cancel = False
+        self._task_status: Any = None
+        self.path_requests = 0
+        self.path_hits = 0
+
+    def state(self) -> JsonDict:
+        return {
+            "legs": [leg.as_dict() for leg in self.legs],
+            "finished": [leg.as_dict() for leg in self.finished],
+            "paths_cached": len(self.paths),
+            "path_requests": self.path_requests,
+            "path_hits": self.path_hits,
+        }
+
+    def _current_station(self) -> str:
+        data = self.robot.snapshots.current().data or {}
+        return data.get("current_station") or ""
+
+    async def _path(self, source: str, target: str) -> List[str]:
+        """Danh sách trạm từ source tới target (không gồm source), lấy từ cache nếu có."""
+        if not source:
+            # không biết trạm xuất phát: path hỏi lúc này có thể gồm trạm robot đang
+            # đứng, để robot tự tìm đường tới target
+            return [target]
+        key = (source, target)
+        cached = self.paths.get(key)
+        if cached is not None:
+            self.path_hits += 1
+            return cached
+        self.path_requests += 1
+        result = await self.async_robot.target_path(target, source)
+        path = [str(p) for p in (result or {}).get("path") or []]
+        if path and path[0] == source:
+            path = path[1:]
+        if not path or path[-1] != target:
+            # robot không trả path: để robot tự tìm đường tới target
+            return [target]
+        self.paths[key] = path
+        return path
+
+    async def _prepare(self, legs: List[Leg], source: str) -> None:
+        """Gán source/path/task_ids cho các leg, nối tiếp nhau từ source."""
+        sources = []
+        for leg in legs:
+            sources.append(source)
+            source = leg.target
+        paths = await asyncio.gather(*(self._path(s, leg.target) for s, leg in zip(sources, legs)))
+        for leg, src, path in zip(legs, sources, paths):
+            leg.source = src
+            leg.path = path
+            leg.task_ids = [f"{leg.leg_id}.{i}" for i in range(len(path))]
+
+    @staticmethod
+    def _move_tasks(legs: List[Leg]) -> List[JsonDict]:
+        tasks = []
+        for leg in legs:
+            prev = leg.source
+            for station, task_id in zip(leg.path, leg.task_ids):
+                task = {"id": station, "task_id": task_id}
+                if prev:
+                    task["source_id"] = prev
+                tasks.append(task)
+                prev = station
+        return tasks
+
+    def _sent(self) -> List[Leg]:
+        return [leg for leg in self.legs if leg.state == LegState.sent]
+
+    async def _dispatch(self) -> None:
+        """Gửi mọi leg queued (đã prepare) lên robot sau các leg đã gửi."""
+        queued = [leg for leg in self.legs if leg.state == LegState.queued]
+        if not queued:
+            return
+        sent = self._sent()
+        source = sent[-1].target if sent else self._current_station()
+        await self._prepare(queued, source)
+        result = await self.async_robot.go_target_list(self._move_tasks(queued))
+        if result is None or result.get("ret_code", 0) != 0:
+            raise NavQueueError(f"robot từ chối gotargetlist: {result}")
+        self._task_status = (self.robot.snapshots.current().data or {}).get("task_status")
+        for leg in queued:
+            leg.state = LegState.sent
+            leg.departed = self._current_station() != leg.target
+        self._ensure_tracking()
+
+    async def _redispatch(self) -> None:
+        """
+        _dispatch cho các leg queued đã được nhận trước đó; robot từ chối thì
+        các leg này không còn trên robot nên đánh dấu failed thay vì để chúng
+        bị gửi ngầm ở lần dispatch sau.
+        """
+        try:
+            await self._dispatch()
+        except Exception:
+            for leg in [leg for leg in self.legs if leg.state == LegState.queued]:
+                self._finish(leg, LegState.failed)
+            raise
+
+    async def _unsend_tail(self) -> None:
+        """Xóa trên robot các leg đã gửi nhưng chưa chạy (sau leg đầu), đưa về queued."""
+        tail = self._sent()[1:]
+        if not tail:
+            return
+        task_ids = [task_id for leg in tail for task_id in leg.task_ids]
+        result = await self.async_robot.clear_target_list(task_ids)
+        if result is None or result.get("ret_code", 0) != 0:
+            raise NavQueueError(f"robot từ chối cleartargetlist: {result}")
+        for leg in tail:
+            leg.state = LegState.queued
+
+    async def append(self, targets: List[str]) -> List[Leg]:
+        if not isinstance(targets, list) or not targets or not all(isinstance(t, str) and t for t in targets):
+            raise NavQueueError("targets cần danh sách tên trạm không rỗng")
+        async with self._lock:
+            legs = [Leg(str(next(self._ids)), target) for target in targets]
+            self.legs.extend(legs)
+            try:
+                await self._dispatch()
+            except Exception:
+                # robot không nhận: bỏ các leg mới, client nhận lỗi
+                self.legs = [leg for leg in self.legs if leg not in legs]
+                raise
+            return legs
+
+    async def reorder(self, leg_ids: List[str]) -> None:
+        """Đổi thứ tự các leg chưa chạy; leg_ids là thứ tự mới của đúng các leg đó."""
+        async with self._lock:
+            sent = self._sent()
+            head = sent[:1]
+            pending = [leg for leg in self.legs if leg not in head]
+            if sorted(leg_ids) != sorted(leg.leg_id for leg in pending):
+                raise NavQueueError("leg_ids phải gồm đúng các leg chưa chạy")
+            by_id = {leg.leg_id: leg for leg in pending}
+            await self._unsend_tail()
+            self.legs = head + [by_id[leg_id] for leg_id in leg_ids]
+            await self._redispatch()
+
+    async def cancel(self, leg_id: Optional[str] = None) -> None:
+        """Hủy một leg, hoặc cả hàng đợi nếu leg_id là None."""
+        async with self._lock:
+            sent = self._sent()
+            head = sent[0] if sent else None
+            if leg_id is None:
+                victims = list(self.legs)
+            else:
+                victims = [leg for leg in self.legs if leg.leg_id == leg_id]
+                if not victims:
+                    raise NavQueueError(f"không có leg {leg_id}")
+            await self._unsend_tail()
+            if head is not None and head in victims:
+                self._expect_cancel = True
+                await self.async_robot.nav_cancel()
+                await self.async_robot.clear_target_list()
+                # robot dừng giữa đường: các leg còn lại đi tiếp từ vị trí hiện tại
+                for leg in self.legs:
+                    if leg.state == LegState.sent:
+                        leg.state = LegState.queued
+            for leg in victims:
+                self._finish(leg, LegState.cancelled)
+            await self._redispatch()
+
+    def _finish(self, leg: Leg, state: str) -> None:
+        leg.state = state
+        leg.finished_at_ms = int(time.time() * 1000)
+        self.legs.remove(leg)
+        self.finished.append(leg)
+
+    def _ensure_tracking(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._track())
+
+    async def _track(self) -> None:
+        store = self.robot.snapshots
+        version = store.current().version
+        while self._sent():
+            snapshot = await store.wait_async(version, 30.0)
+            version = snapshot.version
+            self._advance(snapshot.data or {})
+
+    def _advance(self, data: JsonDict) -> None:
+        station = data.get("current_station") or ""
+        task_status = data.get("task_status")
+        # chỉ xét lúc task_status đổi, bỏ qua giá trị cũ còn lại từ lần chạy trước
+        changed = task_status != self._task_status
+        self._task_status = task_status
+        sent = self._sent()
+        if changed and task_status == TASK_COMPLETED and sent and station == sent[-1].target:
+            for leg in sent:
+                self._finish(leg, LegState.done)
+            return
+        for leg in sent:
+            if station != leg.target:
+                leg.departed = True
+                break
+            if not leg.departed:
+                break
+            self._finish(leg, LegState.done)
+        if changed and task_status in TASK_FAILED:
+            if self._expect_cancel and task_status == TASK_FAILED[1]:
+                self._expect_cancel = False
+                return
+            for leg in self._sent():
+                self._finish(leg, LegState.failed)
+            self.log.warning("Navigation queue stopped, task_status=%s", task_status)
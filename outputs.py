@@ -0,0 +1,97 @@
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from metrics import MODBUS_WRITES_SAVED
+
+_SKIPPED = MODBUS_WRITES_SAVED.labels("noop")
+_COALESCED = MODBUS_WRITES_SAVED.labels("coalesced")
+
+
+def contiguous_runs(writes: Dict[int, int]) -> List[Tuple[int, List[int]]]:
+    """Gom {address: value} thành các đoạn địa chỉ liền nhau [(address, [values...])]."""
+    runs: List[Tuple[int, List[int]]] = []
+    for address in sorted(writes):
+        if runs and runs[-1][0] + len(runs[-1][1]) == address:
+            runs[-1][1].append(writes[address])
+        else:
+            runs.append((address, [writes[address]]))
+    return runs
+
+
+class OutputRegisters:
+    """
+    Lớp ghi thanh ghi output (input register, AMR ghi cho PLC đọc).
+
+    - Ghi lại đúng giá trị đang có thì bỏ qua (đếm "noop").
+    - Lần ghi đầu sau một khoảng yên ghi ra ngay; các lần ghi tiếp theo
+      trong window_s được giữ lại, ghi cùng thanh ghi thì chỉ giữ giá trị
+      cuối (đếm "coalesced"), rồi ghi một lượt khi hết cửa sổ.
+    - Mỗi lượt ghi gộp các địa chỉ liền nhau thành một setValues.
+
+    Mọi ghi vào block phải đi qua lớp này để bản sao giá trị (shadow) đúng.
+    """
+
+    def __init__(self, block, *, window_s: float = 0.02) -> None:
+        self.block = block
+        self.window_s = window_s
+        self._lock = threading.Lock()
+        self._shadow: Dict[int, int] = {}
+        self._pending: Dict[int, int] = {}
+        self._last_flush = 0.0
+        self._timer: Optional[threading.Timer] = None
+
+    def _current(self, address: int) -> int:
+        value = self._shadow.get(address)
+        if value is None:
+            value = self._shadow[address] = self.block.getValues(address, 1)[0]
+        return value
+
+    def write(self, address: int, value: int) -> List[Tuple[int, List[int]]]:
+        return self.write_many({address: value})
+
+    def write_many(self, writes: Dict[int, int], *, flush: bool = False) -> List[Tuple[int, List[int]]]:
+        """
+        Ghi {address: value}; flush=True ghi ra ngay cả phần đang chờ.
+        Trả về các đoạn (address, values) thực sự đã setValues trong lần gọi này.
+        """
+        with self._lock:
+            for address, value in writes.items():
+                value = int(value)
+                if address in self._pending:
+                    _COALESCED.inc()
+                    if value == self._current(address):
+                        del self._pending[address]
+                    else:
+                        self._pending[address] = value
+                elif value == self._current(address):
+                    _SKIPPED.inc()
+                else:
+                    self._pending[address] = value
+            if not self._pending:
+                return []
+            now = time.monotonic()
+            if flush or now - self._last_flush >= self.window_s:
+                return self._flush_locked(now)
+            if self._timer is None:
+                self._timer = threading.Timer(self._last_flush + self.window_s - now, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+            return []
+
+    def flush(self) -> List[Tuple[int, List[int]]]:
+        with self._lock:
+            return self._flush_locked(time.monotonic())
+
+    def _flush_locked(self, now: float) -> List[Tuple[int, List[int]]]:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        runs = contiguous_runs(self._pending)
+        for address, values in runs:
+            self.block.setValues(address, values)
+        self._shadow.update(self._pending)
+        self._pending.clear()
+        if runs:
+            self._last_flush = now
+        return runs
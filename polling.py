@@ -0,0 +1,115 @@
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence
+
+from api import status
+
+JsonDict = Dict[str, Any]
+
+# task_status của robot: 1 WAITING, 2 RUNNING, 3 SUSPENDED
+ACTIVE_TASK_STATUS = (1, 2, 3)
+
+
+@dataclass
+class PollTier:
+    """
+    Nhóm field được poll cùng chu kỳ.
+
+    interval_s dùng khi robot đang có nhiệm vụ di chuyển, idle_interval_s khi
+    robot đứng yên. Tier có refresh_on thì còn được poll ngay khi một trong
+    các field đó đổi giá trị (ví dụ path khi target_id đổi).
+    """
+
+    name: str
+    keys: List[str]
+    interval_s: float
+    idle_interval_s: float
+    refresh_on: List[str] = field(default_factory=list)
+    next_at: float = 0.0
+
+
+def default_tiers() -> List[PollTier]:
+    return [
+        PollTier(
+            "motion",
+            ["x", "y", "angle", "vx", "vy", "task_status", "target_id", "target_dist",
+             "current_station", "last_station", "blocked", "block_reason", "emergency", "confidence"],
+            interval_s=0.1,
+            idle_interval_s=0.5,
+        ),
+        PollTier(
+            "io",
+            ["DI", "DO", "charging", "battery_level", "reloc_status", "fork_height", "current_ip", "current_map"],
+            interval_s=1.0,
+            idle_interval_s=1.0,
+        ),
+        PollTier(
+            "slow",
+            ["fatals", "errors", "warnings", "notices", "area_ids", "path", "unfinished_path"],
+            interval_s=2.0,
+            idle_interval_s=10.0,
+            refresh_on=["task_status", "target_id", "current_station"],
+        ),
+    ]
+
+
+class StatusPoller:
+    """
+    Poll 1100 theo tầng: mỗi lần chỉ hỏi các field của những tier đã đến hạn
+    (gộp trong một request), rồi merge vào robot.data_status qua
+    robot.update_status để data_status luôn là một snapshot đầy đủ.
+    """
+
+    def __init__(self, robot, tiers: Optional[Sequence[PollTier]] = None) -> None:
+        self.robot = robot
+        self.tiers = list(tiers) if tiers is not None else default_tiers()
+        self.log = logging.getLogger("status_poller")
+        self.requests = 0
+        self.keys_requested = 0
+
+    def navigating(self) -> bool:
+        data_status = self.robot.data_status
+        return bool(data_status) and data_status.get("task_status") in ACTIVE_TASK_STATUS
+
+    def poll(self, now: Optional[float] = None) -> Optional[JsonDict]:
+        """Poll các tier đến hạn; trả về dict robot trả lời hoặc None nếu chưa tier nào đến hạn/lỗi."""
+        now = time.monotonic() if now is None else now
+        due = [tier for tier in self.tiers if tier.next_at <= now]
+        if not due:
+            return None
+
+        active = self.navigating()
+        keys: List[str] = []
+        for tier in due:
+            keys.extend(k for k in tier.keys if k not in keys)
+            tier.next_at = now + (tier.interval_s if active else tier.idle_interval_s)
+
+        before = self.robot.data_status or {}
+        result = self.robot.api_robot_status.request(
+            status.robot_status_all1_req,
+            {"keys": keys, "return_laser": False, "return_beams3D": False},
+        )
+        self.requests += 1
+        self.keys_requested += len(keys)
+        if result is None:
+            return None
+        self.robot.update_status(result)
+
+        polled = {id(tier) for tier in due}
+        for tier in self.tiers:
+            if id(tier) in polled or not tier.refresh_on:
+                continue
+            if any(k in result and result[k] != before.get(k) for k in tier.refresh_on):
+                tier.next_at = now
+        now_active = self.navigating()
+        if active != now_active:
+            # Vừa bắt đầu/kết thúc nhiệm vụ: áp dụng chu kỳ mới ngay
+            for tier in self.tiers:
+                interval_s = tier.interval_s if now_active else tier.idle_interval_s
+                tier.next_at = min(tier.next_at, now + interval_s)
+        return result
+
+    def sleep_time(self, now: Optional[float] = None) -> float:
+        now = time.monotonic() if now is None else now
+        return max(min(tier.next_at for tier in self.tiers) - now, 0.0)
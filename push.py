@@ -0,0 +1,127 @@
+import logging
+import socket
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from api import config
+from channel import RobotChannel
+from frame import FrameCodec
+from json_codec import DecodeError
+
+JsonDict = Dict[str, Any]
+
+PUSH_PORT = 19301
+CONFIG_PORT = 19207
+
+
+class PushSubscriber:
+    """
+    Nhận status robot qua port push (19301) thay vì poll 1100.
+
+    Gửi robot_config_push_req (4091) lên port config để đặt chu kỳ push và
+    danh sách field, sau đó đọc liên tục các frame robot đẩy về và gọi
+    on_update(dict) cho mỗi frame. Tự kết nối lại khi mất kết nối.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        fields: List[str],
+        on_update: Callable[[JsonDict], None],
+        *,
+        interval_ms: int = 50,
+        stale_after_s: float = 1.0,
+        timeout_s: float = 10.0,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        self.host = host
+        self.fields = fields
+        self.on_update = on_update
+        self.interval_ms = interval_ms
+        self.stale_after_s = stale_after_s
+        self.timeout_s = timeout_s
+        self.log = logger or logging.getLogger("robot_push")
+
+        self.frames = 0
+        self.last_push_at = 0.0
+        self._sock: Optional[socket.socket] = None
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def fresh(self) -> bool:
+        """True nếu frame push gần nhất chưa quá stale_after_s."""
+        return time.monotonic() - self.last_push_at < self.stale_after_s
+
+    def configure(self) -> bool:
+        channel = RobotChannel(self.host, CONFIG_PORT, timeout_s=self.timeout_s)
+        try:
+            channel.connect()
+            result = channel.request(
+                config.robot_config_push_req,
+                {"interval": self.interval_ms, "included_fields": self.fields},
+            )
+        except OSError as exc:
+            self.log.warning("Configure push failed: %s", exc)
+            return False
+        finally:
+            channel.close()
+        if not result or result.get("ret_code", 0) != 0:
+            self.log.warning("Configure push rejected: %s", result)
+            return False
+        return True
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="robot_push", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        sock, self._sock = self._sock, None
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+
+    def _run(self) -> None:
+        backoff_s = 0.1
+        while not self._stop_event.is_set():
+            try:
+                if self.configure():
+                    sock = socket.create_connection((self.host, PUSH_PORT), timeout=self.timeout_s)
+                    self._sock = sock
+                    backoff_s = 0.1
+                    self._read_loop(sock)
+            except OSError as exc:
+                if not self._stop_event.is_set():
+                    self.log.warning("Push connection lost: %s", exc)
+            finally:
+                self._sock = None
+            self._stop_event.wait(backoff_s)
+            backoff_s = min(backoff_s * 2, 5.0)
+
+    def _read_loop(self, sock: socket.socket) -> None:
+        codec = FrameCodec()
+        # Không nhận được push trong timeout_s coi như kết nối chết
+        sock.settimeout(self.timeout_s)
+        while not self._stop_event.is_set():
+            header = codec.read_header(sock)
+            if header is None:
+                return
+            body = codec.read_body(sock, header[3])
+            try:
+                data = codec.decode(body)
+            except DecodeError:
+                continue
+            if not isinstance(data, dict):
+                continue
+            self.frames += 1
+            self.last_push_at = time.monotonic()
+            self.on_update(data)
@@ -0,0 +1,243 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from config import MODBUS_DEVICES
+
+JsonDict = Dict[str, Any]
+
+
+def _u16(values: List[int]) -> int:
+    return values[0]
+
+
+def _i16(values: List[int]) -> int:
+    value = values[0]
+    return value - 0x10000 if value & 0x8000 else value
+
+
+def _bool(values: List[int]) -> bool:
+    return bool(values[0])
+
+
+def _words(values: List[int]) -> List[int]:
+    return list(values)
+
+
+DECODERS: Dict[str, Callable[[List[int]], Any]] = {
+    "u16": _u16,
+    "i16": _i16,
+    "bool": _bool,
+    "words": _words,
+}
+
+
+@dataclass(frozen=True)
+class Field:
+    name: str
+    address: int
+    count: int = 1
+    type: str = "u16"
+    doc: str = ""
+
+    def decode(self, block: Tuple[int, ...]) -> Any:
+        return DECODERS[self.type](list(block[self.address:self.address + self.count]))
+
+
+class RegisterMap:
+    """Bố cục một block thanh ghi: kích thước và các field có tên, có kiểu."""
+
+    def __init__(self, name: str, size: int, fields: Iterable[Field]) -> None:
+        self.name = name
+        self.size = size
+        self.fields: Dict[str, Field] = {}
+        for f in fields:
+            if f.type not in DECODERS:
+                raise ValueError(f"{name}.{f.name}: kiểu không hỗ trợ {f.type}")
+            if f.address < 0 or f.address + f.count > size:
+                raise ValueError(f"{name}.{f.name}: địa chỉ ngoài block")
+            self.fields[f.name] = f
+
+    def address(self, name: str) -> int:
+        return self.fields[name].address
+
+    def decode(self, block: Tuple[int, ...]) -> JsonDict:
+        return {name: f.decode(block) for name, f in self.fields.items()}
+
+
+# Thiết bị chính (board IO băng tải/lift/stopper); kích thước block lấy từ config
+MAIN_DEVICE = "main"
+_MAIN = MODBUS_DEVICES.get(MAIN_DEVICE, {})
+
+# Holding register: PLC ghi, AMR đọc
+HOLDING = RegisterMap(
+    "holding",
+    _MAIN.get("holding", 30),
+    [
+        Field("lift", 0x02, doc="độ cao lift hiện tại"),
+        Field("stopper", 0x03, doc="trạng thái stopper (Stopper.*)"),
+        Field("conveyor", 0x04, doc="chiều băng tải (Dir.*)"),
+        Field("sensor", 0x0A, 10, "words", doc="cảm biến 0x0A..0x13"),
+    ],
+)
+
+# Input register: AMR ghi, PLC đọc
+INPUT = RegisterMap(
+    "input",
+    _MAIN.get("input", 30),
+    [
+        Field("led", 0x01, doc="màu đèn (Color.*)"),
+        Field("lift", 0x03, doc="độ cao lift yêu cầu"),
+        Field("stopper", 0x04, doc="lệnh stopper (Stopper.*)"),
+        Field("conveyor", 0x05, doc="lệnh băng tải (Dir.*)"),
+    ],
+)
+
+
+@dataclass(frozen=True)
+class DeviceLayout:
+    """Một slave Modbus: tên, slave id và bản đồ hai block."""
+
+    name: str
+    slave: int
+    holding: RegisterMap
+    input: RegisterMap
+
+    def as_dict(self) -> JsonDict:
+        return {
+            "name": self.name,
+            "slave": self.slave,
+            "holding": {"size": self.holding.size, "fields": list(self.holding.fields)},
+            "input": {"size": self.input.size, "fields": list(self.input.fields)},
+        }
+
+
+def _device_map(device: str, kind: str, spec: JsonDict) -> RegisterMap:
+    if device == MAIN_DEVICE:
+        main = HOLDING if kind == "holding" else INPUT
+        if spec.get(kind, main.size) != main.size:
+            raise ValueError(f"{device}.{kind}: kích thước khác bản đồ đã nạp")
+        return main
+    size = spec.get(kind)
+    if not isinstance(size, int) or size <= 0:
+        raise ValueError(f"{device}: cần số thanh ghi {kind} > 0")
+    fields = [Field(**f) for f in spec.get("fields", {}).get(kind, ())]
+    return RegisterMap(f"{device}.{kind}", size, fields)
+
+
+def device_layouts(devices: Dict[str, JsonDict]) -> Dict[str, DeviceLayout]:
+    """Dựng DeviceLayout từ cấu hình dạng config.MODBUS_DEVICES; ValueError nếu sai."""
+    if MAIN_DEVICE not in devices:
+        raise ValueError(f"thiếu thiết bị {MAIN_DEVICE}")
+    layouts: Dict[str, DeviceLayout] = {}
+    slaves: Dict[int, str] = {}
+    for name, spec in devices.items():
+        slave = spec.get("slave")
+        if not isinstance(slave, int) or not 1 <= slave <= 247:
+            raise ValueError(f"{name}: slave id phải trong 1..247")
+        if slave in slaves:
+            raise ValueError(f"{name}: trùng slave id {slave} với {slaves[slave]}")
+        slaves[slave] = name
+        try:
+            holding_map = _device_map(name, "holding", spec)
+            input_map = _device_map(name, "input", spec)
+        except TypeError as e:
+            raise ValueError(f"{name}: field sai: {e}")
+        layouts[name] = DeviceLayout(name, slave, holding_map, input_map)
+    return layouts
+
+
+class RegisterSnapshot:
+    """
+    Ảnh chụp nhất quán của cả hai block ở một thời điểm.
+
+    hr/ir là tuple giá trị thô theo địa chỉ; holding/outputs là field đã
+    decode theo HOLDING/INPUT.
+    """
+
+    __slots__ = ("version", "ts_ms", "taken_at", "hr", "ir", "holding", "outputs")
+
+    def __init__(
+        self,
+        version: int,
+        hr: Tuple[int, ...],
+        ir: Tuple[int, ...],
+        holding_map: RegisterMap = HOLDING,
+        input_map: RegisterMap = INPUT,
+    ) -> None:
+        self.version = version
+        self.ts_ms = int(time.time() * 1000)
+        self.taken_at = time.monotonic()
+        self.hr = hr
+        self.ir = ir
+        self.holding = holding_map.decode(hr)
+        self.outputs = input_map.decode(ir)
+
+    def as_dict(self) -> JsonDict:
+        return {
+            "version": self.version,
+            "ts_ms": self.ts_ms,
+            "holding": self.holding,
+            "outputs": self.outputs,
+        }
+
+
+class RegisterStore:
+    """
+    Đọc mỗi block một lần (một getValues cả block) thành RegisterSnapshot.
+
+    Vòng get_status gọi refresh() mỗi tick; HTTP GET, điều kiện chờ và mission
+    dùng current(). Có notifier (ChangeNotifier của modbus_server) thì chỉ đọc
+    lại block khi notifier báo có ghi thay đổi, không thì khi snapshot cũ hơn
+    max_age_s. version chỉ tăng khi giá trị thay đổi. Mặc định là bản đồ của
+    thiết bị chính; thiết bị khác truyền layout của mình.
+    """
+
+    def __init__(
+        self,
+        holding_block,
+        input_block,
+        *,
+        max_age_s: float = 0.05,
+        notifier=None,
+        layout: Optional[DeviceLayout] = None,
+    ) -> None:
+        self.holding_block = holding_block
+        self.input_block = input_block
+        self.holding_map = layout.holding if layout else HOLDING
+        self.input_map = layout.input if layout else INPUT
+        self.max_age_s = max_age_s
+        self.notifier = notifier
+        self._lock = threading.Lock()
+        self._current: Optional[RegisterSnapshot] = None
+        self._notify_version = -1
+
+    def refresh(self) -> RegisterSnapshot:
+        with self._lock:
+            if self.notifier is not None:
+                # đọc version trước khi đọc block: thay đổi đến sau sẽ làm snapshot cũ đi
+                self._notify_version = self.notifier.version
+            hr = tuple(self.holding_block.getValues(0, self.holding_map.size))
+            ir = tuple(self.input_block.getValues(0, self.input_map.size))
+            current = self._current
+            if current is not None and current.hr == hr and current.ir == ir:
+                current.taken_at = time.monotonic()
+                return current
+            snapshot = self._current = RegisterSnapshot(
+                current.version + 1 if current else 1, hr, ir, self.holding_map, self.input_map
+            )
+            return snapshot
+
+    def current(self, max_age_s: Optional[float] = None) -> RegisterSnapshot:
+        snapshot = self._current
+        if snapshot is None:
+            return self.refresh()
+        if self.notifier is not None and max_age_s is None:
+            if self.notifier.version != self._notify_version:
+                snapshot = self.refresh()
+            return snapshot
+        max_age = self.max_age_s if max_age_s is None else max_age_s
+        if time.monotonic() - snapshot.taken_at > max_age:
+            snapshot = self.refresh()
+        return snapshot
@@ -0,0 +1,186 @@
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence
+
+import numpy as np
+
+JsonDict = Dict[str, Any]
+
+FILTERS = ("debounce", "majority", "hysteresis")
+
+
+@dataclass(frozen=True)
+class SensorFilter:
+    """
+    Bộ lọc áp cho mọi kênh cảm biến trên cửa sổ window mẫu gần nhất.
+
+    - debounce: chỉ đổi khi cả window mẫu cùng một giá trị.
+    - majority: giá trị chiếm quá nửa window (hòa thì giữ nguyên).
+    - hysteresis: lên 1 khi tỉ lệ mẫu 1 >= high, về 0 khi <= low.
+    """
+
+    kind: str = "debounce"
+    window: int = 5
+    high: float = 0.8
+    low: float = 0.2
+
+    def __post_init__(self) -> None:
+        if self.kind not in FILTERS:
+            raise ValueError(f"bộ lọc phải là một trong {FILTERS}")
+        if self.window < 1:
+            raise ValueError("window phải >= 1")
+        if not 0.0 <= self.low < self.high <= 1.0:
+            raise ValueError("cần 0 <= low < high <= 1")
+
+
+class SensorPipeline:
+    """
+    Lấy mẫu các thanh ghi cảm biến (DI, khác 0 là có vật) mỗi period_s trên
+    thread riêng, nhanh hơn nhiều so với vòng get_status, rồi lọc vector hóa
+    trên cửa sổ (window x số kênh).
+
+    Khi giá trị ổn định của một kênh đổi, cạnh (thời điểm, kênh, từ, tới)
+    được lưu lại và on_change(stable, edge_ms) được gọi ngay trên thread lấy
+    mẫu, nên bên dùng thấy chuyển trạng thái mà không phải poll nhanh hơn.
+    Khi cửa sổ đã toàn một giá trị và đầu ra đã theo nó, mẫu lặp lại chỉ
+    tốn một phép so sánh tuple.
+    """
+
+    def __init__(
+        self,
+        block,
+        address: int,
+        count: int,
+        *,
+        period_s: float = 0.01,
+        filter: SensorFilter = SensorFilter(),
+        on_change: Optional[Callable[[List[int], List[Optional[int]]], None]] = None,
+        max_edges: int = 256,
+    ) -> None:
+        self.block = block
+        self.address = address
+        self.count = count
+        self.period_s = period_s
+        self.on_change = on_change
+        self.edges: Deque[JsonDict] = deque(maxlen=max_edges)
+        self.samples = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stable = np.zeros(count, dtype=bool)
+        self._edge_ms: List[Optional[int]] = [None] * count
+        self._last: Optional[tuple] = None
+        self._same = 0
+        self.configure(filter)
+
+    @property
+    def filter(self) -> SensorFilter:
+        return self._filter
+
+    def configure(self, filter: SensorFilter) -> None:
+        """Đổi bộ lọc; cửa sổ mới được lấp bằng giá trị ổn định hiện tại."""
+        with self._lock:
+            self._filter = filter
+            self._window = np.tile(self._stable, (filter.window, 1))
+            self._pos = 0
+            self._same = 0
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sensor_pipeline", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def _run(self) -> None:
+        next_at = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                self.sample()
+            except Exception as e:
+                logging.error(f"SENSOR PIPELINE ERROR: {e}")
+            next_at += self.period_s
+            delay = next_at - time.monotonic()
+            if delay > 0:
+                self._stop.wait(delay)
+            else:
+                # trễ quá một chu kỳ thì lấy mốc mới thay vì chạy bù liên tục
+                next_at = time.monotonic()
+
+    def sample(self, values: Optional[Sequence[int]] = None) -> bool:
+        """Thêm một mẫu (mặc định đọc từ block); trả về True nếu giá trị ổn định đổi."""
+        if values is None:
+            values = self.block.getValues(self.address, self.count)
+        raw = tuple(bool(v) for v in values)
+        with self._lock:
+            self.samples += 1
+            if raw == self._last:
+                self._same += 1
+            else:
+                self._last = raw
+                self._same = 1
+            window = self._window
+            size = len(window)
+            if self._same > size:
+                return False
+            window[self._pos] = raw
+            self._pos = (self._pos + 1) % size
+            stable = self._apply(window)
+            changed = np.nonzero(stable != self._stable)[0]
+            if not len(changed):
+                return False
+            now_ms = int(time.time() * 1000)
+            for channel in changed.tolist():
+                self._edge_ms[channel] = now_ms
+                self.edges.append(
+                    {"ts_ms": now_ms, "channel": channel, "from": int(self._stable[channel]), "to": int(stable[channel])}
+                )
+            self._stable = stable
+            published = self._stable.astype(int).tolist(), list(self._edge_ms)
+        if self.on_change is not None:
+            self.on_change(*published)
+        return True
+
+    def _apply(self, window: np.ndarray) -> np.ndarray:
+        f = self._filter
+        previous = self._stable
+        if f.kind == "debounce":
+            return np.where(window.all(axis=0), True, np.where(window.any(axis=0), previous, False))
+        ones = window.sum(axis=0)
+        if f.kind == "majority":
+            return np.where(ones * 2 > len(window), True, np.where(ones * 2 < len(window), False, previous))
+        ratio = ones / len(window)
+        return np.where(ratio >= f.high, True, np.where(ratio <= f.low, False, previous))
+
+    def stable(self) -> List[int]:
+        return self._stable.astype(int).tolist()
+
+    def edge_ms(self) -> List[Optional[int]]:
+        return list(self._edge_ms)
+
+    def as_dict(self, edges: int = 50) -> JsonDict:
+        with self._lock:
+            recent = list(self.edges)[-edges:] if edges > 0 else []
+            return {
+                "filter": {
+                    "kind": self._filter.kind,
+                    "window": self._filter.window,
+                    "high": self._filter.high,
+                    "low": self._filter.low,
+                },
+                "period_s": self.period_s,
+                "samples": self.samples,
+                "raw": [int(v) for v in self._last] if self._last is not None else None,
+                "stable": self._stable.astype(int).tolist(),
+                "edge_ms": list(self._edge_ms),
+                "edges": recent,
+            }
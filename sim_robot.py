@@ -0,0 +1,307 @@
+import argparse
+import logging
+import random
+import socket
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import json_codec
+from api import control, navigation, status
+from frame import HEADER, FrameCodec
+
+JsonDict = Dict[str, Any]
+
+ROBOT_PORTS = (19204, 19205, 19206)
+
+
+@dataclass
+class SimConfig:
+    """
+    Cấu hình robot giả.
+
+    delay_s áp cho mọi request, delays ghi đè theo msgType. payload_bytes
+    thêm dữ liệu path giả vào reply status để thử gói lớn. Các *_rate là xác
+    suất (0..1) cho từng kiểu lỗi trên mỗi request.
+    """
+
+    delay_s: float = 0.0
+    delays: Dict[int, float] = field(default_factory=dict)
+    payload_bytes: int = 0
+    nav_time_s: float = 2.0
+    drop_rate: float = 0.0
+    disconnect_rate: float = 0.0
+    short_header_rate: float = 0.0
+    error_rate: float = 0.0
+    seed: Optional[int] = None
+
+
+class SimRobot:
+    """
+    Robot giả nói đúng giao thức PACK_FMT_STR trên các port 19204/19205/19206.
+
+    Mỗi kết nối được xử lý tuần tự như robot thật. Trạng thái tối thiểu
+    (vị trí, task_status, current_station, ...) đổi theo lệnh navigation để
+    chạy được cả luồng poll status lẫn kiểm tra vị trí.
+
+    Chạy cả hệ thống offline: python sim_robot.py rồi HOST_ROBOT=127.0.0.1 python main.py
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        config: Optional[SimConfig] = None,
+        *,
+        ports=ROBOT_PORTS,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        self.host = host
+        self.config = config or SimConfig()
+        self.ports = ports
+        self.log = logger or logging.getLogger("sim_robot")
+        self.requests = 0
+
+        self._rng = random.Random(self.config.seed)
+        self._servers: List[socket.socket] = []
+        self._conns: List[socket.socket] = []
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._nav_timer: Optional[threading.Timer] = None
+        # các đoạn gotargetlist chưa chạy: (task_id, station)
+        self._task_list: List[tuple] = []
+        self.state: JsonDict = {
+            "confidence": 0.98,
+            "DI": [{"id": i, "status": False, "valid": True} for i in range(8)],
+            "DO": [{"id": i, "status": False} for i in range(8)],
+            "current_station": "LM100",
+            "charging": False,
+            "last_station": "LM100",
+            "vx": 0.0,
+            "vy": 0.0,
+            "blocked": False,
+            "block_reason": [],
+            "battery_level": 0.9,
+            "task_status": 0,
+            "target_id": "",
+            "emergency": False,
+            "reloc_status": 1,
+            "fatals": [],
+            "errors": [],
+            "warnings": [],
+            "notices": [],
+            "current_ip": host,
+            "x": 0.0,
+            "y": 0.0,
+            "fork_height": 0.0,
+            "area_ids": [],
+            "angle": 0.0,
+            "target_dist": 0.0,
+            "path": [],
+            "unfinished_path": [],
+            "current_map": "sim",
+        }
+        # trạm giả trên lưới 1 m: LM100 ở gốc, LM<n> tại (n % 20, n // 20)
+        self.stations: List[JsonDict] = [{"id": "LM100", "type": "LocationMark", "x": 0.0, "y": 0.0, "r": 0.0, "desc": ""}] + [
+            {"id": f"LM{n}", "type": "LocationMark", "x": float(n % 20), "y": float(n // 20), "r": 0.0, "desc": ""}
+            for n in range(1, 100)
+        ]
+
+    def start(self) -> None:
+        self._stop_event.clear()
+        for port in self.ports:
+            srv = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            srv.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            srv.bind((self.host, port))
+            srv.listen(16)
+            self._servers.append(srv)
+            threading.Thread(target=self._accept_loop, args=(srv,), name=f"sim_accept_{port}", daemon=True).start()
+        self.log.info("Sim robot listening on %s ports %s", self.host, list(self.ports))
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        for sock in self._servers + self._conns:
+            # shutdown để accept()/recv() đang chặn ở thread khác trả về ngay
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+        self._servers = []
+        self._conns = []
+        if self._nav_timer is not None:
+            self._nav_timer.cancel()
+
+    def drop_connections(self) -> None:
+        """Đóng mọi kết nối client đang mở, như khi robot khởi động lại."""
+        with self._lock:
+            conns, self._conns = self._conns, []
+        for conn in conns:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+                conn.close()
+            except OSError:
+                pass
+
+    def _accept_loop(self, srv: socket.socket) -> None:
+        while not self._stop_event.is_set():
+            try:
+                conn, _ = srv.accept()
+            except OSError:
+                return
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with self._lock:
+                self._conns.append(conn)
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn: socket.socket) -> None:
+        codec = FrameCodec()
+        cfg = self.config
+        try:
+            while not self._stop_event.is_set():
+                header = codec.read_header(conn)
+                if header is None:
+                    break
+                body = codec.read_body(conn, header[3])
+                msg = json_codec.loads(body) if header[3] else {}
+                reqId, msgType = header[2], header[4]
+                self.requests += 1
+
+                delay_s = cfg.delays.get(msgType, cfg.delay_s)
+                if delay_s:
+                    time.sleep(delay_s)
+                roll = self._rng.random()
+                if roll < cfg.disconnect_rate:
+                    break
+                roll -= cfg.disconnect_rate
+                if roll < cfg.drop_rate:
+                    continue
+                roll -= cfg.drop_rate
+                if roll < cfg.short_header_rate:
+                    conn.sendall(HEADER.pack(0x5A, 0x01, reqId, 0, msgType + 10000, b"\x00" * 6)[:8])
+                    break
+                roll -= cfg.short_header_rate
+                if roll < cfg.error_rate:
+                    reply = {"ret_code": 40000, "err_msg": "injected error"}
+                else:
+                    reply = self.handle(msgType, msg)
+                data = json_codec.dumps(reply)
+                conn.sendall(HEADER.pack(0x5A, 0x01, reqId, len(data), msgType + 10000, b"\x00" * 6) + data)
+        except (OSError, json_codec.DecodeError):
+            pass
+        finally:
+            with self._lock:
+                if conn in self._conns:
+                    self._conns.remove(conn)
+            try:
+                conn.close()
+            except OSError:
+                pass
+
+    def handle(self, msgType: int, msg: JsonDict) -> JsonDict:
+        with self._lock:
+            if msgType == status.robot_status_all1_req:
+                keys = msg.get("keys") or list(self.state)
+                reply = {k: self.state[k] for k in keys if k in self.state}
+                if self.config.payload_bytes and "path" in reply:
+                    n = self.config.payload_bytes // 16
+                    reply["path"] = [[round(i * 0.01, 2), 0.0] for i in range(n)]
+                reply["ret_code"] = 0
+                return reply
+            if msgType == status.robot_status_map_req:
+                return {"ret_code": 0, "current_map": self.state["current_map"], "current_map_md5": "", "maps": [self.state["current_map"]]}
+            if msgType == status.robot_status_station:
+                return {"ret_code": 0, "stations": self.stations}
+            if msgType == navigation.robot_task_go_target_req:
+                self._task_list = []
+                self._start_nav(str(msg.get("id", "")))
+            elif msgType == navigation.robot_task_target_path_req:
+                source = msg.get("source_id") or self.state["current_station"]
+                return {"ret_code": 0, "path": [source, str(msg.get("id", ""))]}
+            elif msgType == navigation.robot_task_gotargetlist_req:
+                self._task_list.extend((t.get("task_id", ""), str(t["id"])) for t in msg.get("move_task_list", []))
+                if self.state["task_status"] not in (2, 3) and self._task_list:
+                    self._start_nav(self._task_list.pop(0)[1])
+            elif msgType == navigation.robot_task_cleartargetlist_req:
+                task_ids = msg.get("task_ids")
+                self._task_list = [t for t in self._task_list if task_ids and t[0] not in task_ids]
+            elif msgType == navigation.robot_task_cancel_req:
+                self._task_list = []
+                self._finish_nav(6)
+            elif msgType == navigation.robot_task_pause_req and self.state["task_status"] == 2:
+                self.state["task_status"] = 3
+            elif msgType == navigation.robot_task_resume_req and self.state["task_status"] == 3:
+                self.state["task_status"] = 2
+            elif msgType == control.robot_control_motion_req:
+                self.state["vx"] = msg.get("vx", 0.0)
+                self.state["vy"] = msg.get("vy", 0.0)
+            return {"ret_code": 0}
+
+    def _start_nav(self, target: str) -> None:
+        if self._nav_timer is not None:
+            self._nav_timer.cancel()
+        self.state.update(task_status=2, target_id=target, vx=0.5, target_dist=1.0)
+        self._nav_timer = threading.Timer(self.config.nav_time_s, self._arrive, args=(target,))
+        self._nav_timer.daemon = True
+        self._nav_timer.start()
+
+    def _arrive(self, target: str) -> None:
+        with self._lock:
+            if self.state["target_id"] == target and self.state["task_status"] in (2, 3):
+                self.state["last_station"] = self.state["current_station"]
+                self.state["current_station"] = target
+                if self._task_list:
+                    # gotargetlist: đi tiếp đoạn sau, không dừng
+                    self._start_nav(self._task_list.pop(0)[1])
+                else:
+                    self._finish_nav(4)
+
+    def _finish_nav(self, task_status: int) -> None:
+        if self._nav_timer is not None:
+            self._nav_timer.cancel()
+            self._nav_timer = None
+        self.state.update(task_status=task_status, vx=0.0, target_dist=0.0)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Robot giả cho AMR (ports 19204/19205/19206)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--delay", type=float, default=0.0, help="Trễ mỗi reply (giây)")
+    parser.add_argument("--payload", type=int, default=0, help="Số byte path giả trong reply status")
+    parser.add_argument("--nav-time", type=float, default=2.0, help="Thời gian một lần navigation (giây)")
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--disconnect-rate", type=float, default=0.0)
+    parser.add_argument("--short-header-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"])
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=getattr(logging, args.log_level),
+        format="%(asctime)s %(levelname)s %(name)s - %(message)s",
+    )
+    sim = SimRobot(
+        args.host,
+        SimConfig(
+            delay_s=args.delay,
+            payload_bytes=args.payload,
+            nav_time_s=args.nav_time,
+            drop_rate=args.drop_rate,
+            disconnect_rate=args.disconnect_rate,
+            short_header_rate=args.short_header_rate,
+            error_rate=args.error_rate,
+        ),
+    )
+    sim.start()
+    try:
+        while True:
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sim.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,144 @@
+import asyncio
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import json_codec
+
+JsonDict = Dict[str, Any]
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def _set_result(fut: asyncio.Future, value: Any) -> None:
+    if not fut.done():
+        fut.set_result(value)
+
+
+class Waiters:
+    """
+    Người chờ một giá trị version tăng dần, chờ bằng thread lẫn asyncio.
+
+    Bên phát đổi trạng thái trong `with waiters.cond:` rồi gọi
+    release_locked() (vẫn trong khóa) và wake() sau khi nhả khóa. Future
+    asyncio luôn được gỡ khỏi danh sách khi wait_async kết thúc, kể cả khi
+    bị cancel (wait_until hủy nhánh chờ thua).
+    """
+
+    def __init__(self) -> None:
+        self.cond = threading.Condition()
+        self._async_waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+    def __len__(self) -> int:
+        return len(self._async_waiters)
+
+    def release_locked(self) -> List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]]:
+        """Gọi khi đang giữ cond: đánh thức thread chờ, trả về các future asyncio cần wake()."""
+        self.cond.notify_all()
+        waiters, self._async_waiters = self._async_waiters, []
+        return waiters
+
+    @staticmethod
+    def wake(waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]], value: Any) -> None:
+        for loop, fut in waiters:
+            try:
+                loop.call_soon_threadsafe(_set_result, fut, value)
+            except RuntimeError:
+                # event loop đã đóng
+                pass
+
+    def wait(self, ready: Callable[[], bool], timeout_s: float) -> None:
+        """Chặn thread tới khi ready() hoặc hết timeout_s."""
+        deadline = time.monotonic() + timeout_s
+        with self.cond:
+            while not ready():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.cond.wait(remaining)
+
+    async def wait_async(self, ready: Callable[[], bool], timeout_s: float) -> None:
+        """Như wait() nhưng không chặn event loop."""
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        with self.cond:
+            if ready():
+                return
+            self._async_waiters.append((loop, fut))
+        try:
+            await asyncio.wait_for(fut, timeout_s)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self.cond:
+                try:
+                    self._async_waiters.remove((loop, fut))
+                except ValueError:
+                    pass
+
+
+class StatusSnapshot:
+    """
+    Một phiên bản bất biến của data_status.
+
+    `data` không được sửa sau khi publish; `body` (JSON đã encode) chỉ được
+    tính một lần cho mỗi version và dùng lại cho mọi lần đọc.
+    """
+
+    __slots__ = ("version", "data", "ts_ms", "_body")
+
+    def __init__(self, version: int, data: Optional[JsonDict]) -> None:
+        self.version = version
+        self.data = data
+        self.ts_ms = _now_ms()
+        self._body: Optional[bytes] = None
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.version}"'
+
+    @property
+    def body(self) -> bytes:
+        body = self._body
+        if body is None:
+            body = self._body = json_codec.dumps(self.data)
+        return body
+
+
+class StatusStore:
+    """
+    Giữ snapshot status mới nhất và đánh thức người đang chờ thay đổi.
+
+    publish() gọi từ thread bất kỳ (poller, push); chờ được cả bằng thread
+    (wait) lẫn asyncio (wait_async).
+    """
+
+    def __init__(self) -> None:
+        self._current = StatusSnapshot(0, None)
+        self._waiters = Waiters()
+
+    def current(self) -> StatusSnapshot:
+        return self._current
+
+    def publish(self, data: JsonDict) -> StatusSnapshot:
+        """Tạo snapshot mới nếu data khác snapshot hiện tại; data không được sửa sau đó."""
+        with self._waiters.cond:
+            current = self._current
+            if current.data == data:
+                return current
+            snapshot = self._current = StatusSnapshot(current.version + 1, data)
+            waiters = self._waiters.release_locked()
+        Waiters.wake(waiters, snapshot)
+        return snapshot
+
+    def wait(self, since: int, timeout_s: float) -> StatusSnapshot:
+        """Chờ (chặn thread) tới khi có version > since hoặc hết timeout_s."""
+        self._waiters.wait(lambda: self._current.version > since, timeout_s)
+        return self._current
+
+    async def wait_async(self, since: int, timeout_s: float) -> StatusSnapshot:
+        """Như wait() nhưng không chặn event loop."""
+        await self._waiters.wait_async(lambda: self._current.version > since, timeout_s)
+        return self._current
@@ -1,5 +1,4 @@
 import argparse
-import json
 import logging
 import signal
 import socket
@@ -9,16 +8,21 @@ import uuid
 from dataclasses import dataclass, field
 from typing import Any, Dict, Optional, Tuple
 
+import json_codec
+from metrics import SOCKET_BYTES, SOCKET_CLIENTS
 
 JsonDict = Dict[str, Any]
 
+_BYTES_IN = SOCKET_BYTES.labels("in")
+_BYTES_OUT = SOCKET_BYTES.labels("out")
+
 
 def _now_ms() -> int:
     return int(time.time() * 1000)
 
 
 def _json_dumps(obj: Any) -> bytes:
-    return (json.dumps(obj, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+    return json_codec.dumps(obj) + b"\n"
 
 
 def _safe_json_loads(line: str) -> Optional[JsonDict]:
@@ -26,9 +30,9 @@ def _safe_json_loads(line: str) -> Optional[JsonDict]:
     if not line:
         return None
     try:
-        data = json.loads(line)
+        data = json_codec.loads(line)
         return data if isinstance(data, dict) else None
-    except json.JSONDecodeError:
+    except json_codec.DecodeError:
         return None
 
 
@@ -47,6 +51,7 @@ class ClientConnection:
         data = _json_dumps(payload)
         with self.send_lock:
             self.sock.sendall(data)
+        _BYTES_OUT.inc(len(data))
 
     def close(self) -> None:
         if self.closed.is_set():
@@ -130,6 +135,7 @@ class SocketServer:
         with self._clients_lock:
             clients = list(self._clients.values())
             self._clients.clear()
+        SOCKET_CLIENTS.dec(len(clients))
 
         for c in clients:
             c.close()
@@ -178,6 +184,7 @@ class SocketServer:
             client = ClientConnection(client_id=client_id, sock=sock, addr=addr)
             with self._clients_lock:
                 self._clients[client_id] = client
+            SOCKET_CLIENTS.inc()
 
             self.log.info("Client connected id=%s addr=%s:%s", client_id, addr[0], addr[1])
             t = threading.Thread(
@@ -206,6 +213,7 @@ class SocketServer:
 
                 if not chunk:
                     break
+                _BYTES_IN.inc(len(chunk))
 
                 try:
                     as_text = chunk.decode("utf-8", errors="replace")
@@ -300,6 +308,7 @@ class SocketServer:
             client = self._clients.pop(client_id, None)
         if not client:
             return
+        SOCKET_CLIENTS.dec()
         client.close()
         self.log.info("Client disconnected id=%s addr=%s:%s", client_id, client.addr[0], client.addr[1])
 
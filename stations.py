@@ -0,0 +1,224 @@
+import logging
+import math
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from api import status
+from channel import RobotChannel
+
+JsonDict = Dict[str, Any]
+
+DEFAULT_CELL_M = 2.0
+
+
+@dataclass(frozen=True)
+class Station:
+    id: str
+    x: float
+    y: float
+    type: str = ""
+    r: float = 0.0
+    desc: str = ""
+
+    def as_dict(self) -> JsonDict:
+        return {"id": self.id, "x": self.x, "y": self.y, "type": self.type, "r": self.r, "desc": self.desc}
+
+
+class StationIndex:
+    """
+    Trạm của một bản đồ, tra theo id và theo vị trí.
+
+    Chỉ mục không gian là lưới đều cạnh cell_m mét: nearest() tìm theo vòng
+    ô quanh điểm hỏi và dừng khi vòng kế tiếp chắc chắn xa hơn kết quả tốt
+    nhất, within() chỉ duyệt các ô giao với hình vuông bao bán kính.
+    """
+
+    def __init__(self, stations: Iterable[Station], cell_m: float = DEFAULT_CELL_M) -> None:
+        self.cell_m = cell_m
+        self.by_id: Dict[str, Station] = {}
+        self.grid: Dict[Tuple[int, int], List[Station]] = {}
+        for station in stations:
+            self.by_id[station.id] = station
+            self.grid.setdefault(self._cell(station.x, station.y), []).append(station)
+        cells = list(self.grid) or [(0, 0)]
+        self._min = (min(c[0] for c in cells), min(c[1] for c in cells))
+        self._max = (max(c[0] for c in cells), max(c[1] for c in cells))
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def _cell(self, x: float, y: float) -> Tuple[int, int]:
+        return math.floor(x / self.cell_m), math.floor(y / self.cell_m)
+
+    def get(self, station_id: str) -> Optional[Station]:
+        return self.by_id.get(station_id)
+
+    def nearest(self, x: float, y: float) -> Optional[Tuple[Station, float]]:
+        if not self.by_id:
+            return None
+        cx, cy = self._cell(x, y)
+        max_ring = max(
+            abs(cx - self._min[0]), abs(cx - self._max[0]),
+            abs(cy - self._min[1]), abs(cy - self._max[1]),
+        )
+        grid = self.grid
+        best: Optional[Station] = None
+        best_d2 = math.inf
+        # điểm hỏi xa ngoài bản đồ: các vòng gần toàn ô rỗng, duyệt quá số trạm
+        # thì quét thẳng by_id cho rẻ hơn (chặn trên O(số trạm))
+        budget = len(self.by_id) + 8
+        for ring in range(max_ring + 1):
+            budget -= 8 * ring or 1
+            if budget < 0:
+                return self._scan(x, y)
+            for cell in self._ring(cx, cy, ring):
+                for station in grid.get(cell, ()):
+                    d2 = (station.x - x) ** 2 + (station.y - y) ** 2
+                    if d2 < best_d2:
+                        best, best_d2 = station, d2
+            # mọi điểm ở vòng ring + 1 cách điểm hỏi ít nhất ring * cell_m
+            if best is not None and best_d2 <= (ring * self.cell_m) ** 2:
+                break
+        return best, math.sqrt(best_d2)
+
+    def _scan(self, x: float, y: float) -> Tuple[Station, float]:
+        best = min(self.by_id.values(), key=lambda s: (s.x - x) ** 2 + (s.y - y) ** 2)
+        return best, math.hypot(best.x - x, best.y - y)
+
+    @staticmethod
+    def _ring(cx: int, cy: int, ring: int) -> Iterable[Tuple[int, int]]:
+        if ring == 0:
+            yield cx, cy
+            return
+        for dx in range(-ring, ring + 1):
+            yield cx + dx, cy - ring
+            yield cx + dx, cy + ring
+        for dy in range(-ring + 1, ring):
+            yield cx - ring, cy + dy
+            yield cx + ring, cy + dy
+
+    def within(self, x: float, y: float, radius: float) -> List[Tuple[Station, float]]:
+        """Các trạm cách (x, y) không quá radius, gần nhất trước."""
+        x0, y0 = self._cell(x - radius, y - radius)
+        x1, y1 = self._cell(x + radius, y + radius)
+        x0, y0 = max(x0, self._min[0]), max(y0, self._min[1])
+        x1, y1 = min(x1, self._max[0]), min(y1, self._max[1])
+        r2 = radius * radius
+        found = []
+        grid = self.grid
+        for gx in range(x0, x1 + 1):
+            for gy in range(y0, y1 + 1):
+                for station in grid.get((gx, gy), ()):
+                    d2 = (station.x - x) ** 2 + (station.y - y) ** 2
+                    if d2 <= r2:
+                        found.append((d2, station))
+        found.sort(key=lambda item: item[0])
+        return [(station, math.sqrt(d2)) for d2, station in found]
+
+    def distance(self, x: float, y: float, station_id: str) -> Optional[float]:
+        station = self.by_id.get(station_id)
+        if station is None:
+            return None
+        return math.hypot(station.x - x, station.y - y)
+
+
+class StationMap:
+    """
+    Cache danh sách trạm của bản đồ đang nạp trên robot.
+
+    Chỉ hỏi robot (1300 rồi 1301) khi current_map trong status đổi, tức mỗi
+    lần nạp bản đồ một lần; mọi truy vấn sau đó đọc StationIndex trong bộ nhớ.
+    check() được gọi từ vòng get_status nên chỉ khởi động nạp trên thread
+    nền, không chờ robot trả lời.
+    """
+
+    def __init__(
+        self,
+        channel: RobotChannel,
+        *,
+        cell_m: float = DEFAULT_CELL_M,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        self.channel = channel
+        self.cell_m = cell_m
+        self.log = logger or logging.getLogger("stations")
+        self.index = StationIndex((), cell_m)
+        self.map_name: Optional[str] = None
+        self.map_md5 = ""
+        self.loads = 0
+        self._seen_map: Optional[str] = None
+        self._lock = threading.Lock()
+        self._loader: Optional[threading.Thread] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self.map_name is not None
+
+    def check(self, data: Optional[JsonDict]) -> bool:
+        """
+        Gọi với data_status mới; bản đồ đã đổi thì nạp lại trạm ở thread nền.
+        Trả về True nếu đã khởi động nạp.
+        """
+        current_map = (data or {}).get("current_map")
+        if current_map is None or current_map == self._seen_map:
+            return False
+        if not self.refresh():
+            # đang có lần nạp khác chạy: tick sau thử lại
+            return False
+        # mỗi lần đổi bản đồ chỉ thử một lần, lỗi thì để truy vấn sau gọi ensure_loaded
+        self._seen_map = current_map
+        return True
+
+    def refresh(self) -> bool:
+        """Nạp lại trạm ở thread nền; bỏ qua nếu đang có một lần nạp chạy."""
+        loader = self._loader
+        if loader is not None and loader.is_alive():
+            return False
+        self._loader = threading.Thread(target=self.load, name="stations_load", daemon=True)
+        self._loader.start()
+        return True
+
+    def ensure_loaded(self) -> None:
+        if not self.loaded:
+            self.load()
+
+    def load(self) -> bool:
+        with self._lock:
+            info = self.channel.request(status.robot_status_map_req, {})
+            if info is None or info.get("ret_code", 0) != 0:
+                logging.error("Load map info error: " + str(info))
+                return False
+            reply = self.channel.request(status.robot_status_station, {})
+            if reply is None or reply.get("ret_code", 0) != 0:
+                logging.error("Load station error: " + str(reply))
+                return False
+            stations = []
+            for item in reply.get("stations") or []:
+                try:
+                    stations.append(
+                        Station(
+                            str(item["id"]),
+                            float(item["x"]),
+                            float(item["y"]),
+                            str(item.get("type", "")),
+                            float(item.get("r", 0.0)),
+                            str(item.get("desc", "")),
+                        )
+                    )
+                except (KeyError, TypeError, ValueError):
+                    continue
+            self.index = StationIndex(stations, self.cell_m)
+            self.map_name = str(info.get("current_map", ""))
+            self.map_md5 = str(info.get("current_map_md5", ""))
+            self.loads += 1
+            self.log.info("Loaded %d stations of map %s", len(stations), self.map_name)
+            return True
+
+    def info(self) -> JsonDict:
+        return {
+            "map": self.map_name,
+            "md5": self.map_md5,
+            "stations": len(self.index),
+            "loads": self.loads,
+        }
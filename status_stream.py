@@ -0,0 +1,165 @@
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Set
+
+import json_codec
+from snapshot import StatusSnapshot, StatusStore
+
+JsonDict = Dict[str, Any]
+
+_MISSING = object()
+
+
+def status_delta(old: Optional[JsonDict], new: Optional[JsonDict]) -> JsonDict:
+    """Các key đổi giá trị/mới thêm và các key bị xóa giữa hai snapshot."""
+    old = old or {}
+    new = new or {}
+    changed = {k: v for k, v in new.items() if old.get(k, _MISSING) != v}
+    removed = [k for k in old if k not in new]
+    return {"data": changed, "removed": removed}
+
+
+class _Subscriber:
+    def __init__(self, websocket, max_pending: int) -> None:
+        self.websocket = websocket
+        self.queue: "asyncio.Queue[str]" = asyncio.Queue(max_pending)
+        self.needs_keyframe = True
+        self.overflows = 0
+        self.closed = False
+
+
+class StatusStream:
+    """
+    Đẩy data_status qua WebSocket: gửi frame đầy đủ (keyframe) khi mới kết
+    nối và định kỳ, còn lại chỉ gửi các key thay đổi.
+
+    Mỗi version chỉ encode một lần rồi chia cho mọi subscriber. Subscriber
+    chậm có hàng đợi giới hạn: khi đầy thì bỏ các frame đang chờ và thay bằng
+    một keyframe (gộp thay đổi); đầy liên tục quá max_overflows lần hoặc gửi
+    quá send_timeout_s thì bị ngắt.
+    """
+
+    def __init__(
+        self,
+        store: StatusStore,
+        *,
+        keyframe_every: int = 100,
+        max_pending: int = 8,
+        max_overflows: int = 5,
+        send_timeout_s: float = 5.0,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        self.store = store
+        self.keyframe_every = keyframe_every
+        self.max_pending = max_pending
+        self.max_overflows = max_overflows
+        self.send_timeout_s = send_timeout_s
+        self.log = logger or logging.getLogger("status_stream")
+
+        self._subscribers: Set[_Subscriber] = set()
+        self._task: Optional[asyncio.Task] = None
+        self.frames_encoded = 0
+        self.dropped_subscribers = 0
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def _encode(self, kind: str, snapshot: StatusSnapshot, payload: JsonDict) -> str:
+        self.frames_encoded += 1
+        return json_codec.dumps({"type": kind, "version": snapshot.version, **payload}).decode("utf-8")
+
+    def _keyframe(self, snapshot: StatusSnapshot) -> str:
+        return self._encode("full", snapshot, {"data": snapshot.data, "removed": []})
+
+    async def _run(self) -> None:
+        prev = self.store.current()
+        last_keyframe = prev.version
+        while self._subscribers:
+            snapshot = await self.store.wait_async(prev.version, 30.0)
+            if snapshot.version == prev.version:
+                continue
+            full: Optional[str] = None
+            if snapshot.version - last_keyframe >= self.keyframe_every:
+                full = self._keyframe(snapshot)
+                last_keyframe = snapshot.version
+            delta = None if full is not None else self._encode("delta", snapshot, status_delta(prev.data, snapshot.data))
+
+            for sub in list(self._subscribers):
+                msg = delta
+                if full is not None or sub.needs_keyframe:
+                    if full is None:
+                        full = self._keyframe(snapshot)
+                    msg = full
+                try:
+                    sub.queue.put_nowait(msg)
+                    sub.needs_keyframe = False
+                except asyncio.QueueFull:
+                    self._coalesce(sub, full or self._keyframe(snapshot))
+            prev = snapshot
+        self._task = None
+
+    def _coalesce(self, sub: _Subscriber, keyframe: str) -> None:
+        sub.overflows += 1
+        if sub.overflows > self.max_overflows:
+            self._drop(sub)
+            return
+        while not sub.queue.empty():
+            sub.queue.get_nowait()
+        sub.queue.put_nowait(keyframe)
+        sub.needs_keyframe = False
+
+    def _drop(self, sub: _Subscriber) -> None:
+        if sub.closed:
+            return
+        sub.closed = True
+        self._subscribers.discard(sub)
+        self.dropped_subscribers += 1
+        # đánh thức sender để nó đóng kết nối
+        while not sub.queue.empty():
+            sub.queue.get_nowait()
+        sub.queue.put_nowait("")
+
+    async def serve(self, websocket) -> None:
+        """Phục vụ một WebSocket đã accept() cho tới khi client ngắt hoặc bị drop."""
+        sub = _Subscriber(websocket, self.max_pending)
+        sub.queue.put_nowait(self._keyframe(self.store.current()))
+        sub.needs_keyframe = False
+        self._subscribers.add(sub)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+        receiver = asyncio.create_task(self._receive_until_closed(sub))
+        try:
+            while True:
+                msg = await sub.queue.get()
+                if sub.closed or not msg:
+                    break
+                await asyncio.wait_for(websocket.send_text(msg), self.send_timeout_s)
+                if sub.queue.empty():
+                    sub.overflows = 0
+        except asyncio.TimeoutError:
+            self.log.warning("Drop slow status subscriber")
+            self._drop(sub)
+        except Exception:
+            pass
+        finally:
+            receiver.cancel()
+            self._subscribers.discard(sub)
+            sub.closed = True
+            try:
+                await websocket.close()
+            except Exception:
+                pass
+
+    async def _receive_until_closed(self, sub: _Subscriber) -> None:
+        try:
+            while True:
+                message = await sub.websocket.receive()
+                if message.get("type") == "websocket.disconnect":
+                    break
+        except Exception:
+            pass
+        sub.closed = True
+        if sub.queue.empty():
+            sub.queue.put_nowait("")
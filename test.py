@@ -1,9 +1,11 @@
+import asyncio
 import socket
 import threading
 import time
-from typing import Tuple
+from typing import List, Tuple
 
 from config import SOCKET_HOST, SOCKET_PORT
+from sim_robot import SimConfig, SimRobot
 from socket_server import SocketServer
 
 
@@ -219,7 +221,268 @@ def test_get_client_id() -> None:
         server.stop()
         print("[TEST_GET_ID] Server stopped.")
 
+
+def test_status_latency_during_slow_navigation() -> None:
+    """
+    Kiểm tra GET /status vẫn trả lời nhanh trong lúc POST /navigation đang chờ
+    một reply chậm (3 s) từ robot.
+    """
+    import httpx
+    from api import navigation
+
+    sim = SimRobot("127.0.0.1", SimConfig(delays={navigation.robot_task_go_target_req: 3.0}))
+    sim.start()
+    import app as app_module
+
+    for channel in (
+        app_module.control.api_robot_status,
+        app_module.control.api_robot_navigation,
+        app_module.control.api_robot_control,
+    ):
+        channel.host = "127.0.0.1"
+    app_module.control.connect_all()
+    app_module.control.status()
+
+    async def _scenario() -> Tuple[float, List[float]]:
+        transport = httpx.ASGITransport(app=app_module.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://amr") as client:
+            t_nav = time.perf_counter()
+            nav = asyncio.create_task(client.post("/navigation", json={"id": "LM101"}))
+            await asyncio.sleep(0.1)
+            latencies = []
+            for _ in range(20):
+                t0 = time.perf_counter()
+                await client.get("/status")
+                latencies.append(time.perf_counter() - t0)
+            await nav
+            return time.perf_counter() - t_nav, latencies
+
+    try:
+        nav_s, latencies = asyncio.run(_scenario())
+    finally:
+        # dừng supervisor kết nối và push trước, không thì chúng tiếp tục reconnect tới sim đã tắt
+        app_module.control.push.stop()
+        app_module.control.connection.stop()
+        sim.stop()
+
+    latencies.sort()
+    print(f"[TEST_LATENCY] navigation: {nav_s * 1000:.0f} ms")
+    print(
+        f"[TEST_LATENCY] /status p50={latencies[len(latencies) // 2] * 1000:.1f} ms"
+        f" max={latencies[-1] * 1000:.1f} ms"
+    )
+    assert latencies[-1] < 0.2, "GET /status bị chặn bởi navigation"
+    assert nav_s >= 3.0
+
+
+def test_modbus_tcp_reads_per_second(clients: int = 4, duration_s: float = 3.0) -> None:
+    """
+    Chạy server Modbus TCP cục bộ (cùng context với RTU) rồi cho nhiều client
+    pymodbus đọc liên tục cả block holding register; in số lần đọc/giây.
+    """
+    from pymodbus.client import ModbusTcpClient
+
+    from modbus_server import ModbusServer
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+
+    server = ModbusServer()
+    server.datablock_holding_register.setValues(0x02, [7])
+    server.start_tcp("127.0.0.1", port)
+
+    counts: List[int] = [0] * clients
+    errors: List[str] = []
+    start = threading.Event()
+
+    def _reader(i: int) -> None:
+        client = ModbusTcpClient("127.0.0.1", port=port, timeout=2)
+        for _ in range(50):
+            if client.connect():
+                break
+            time.sleep(0.05)
+        start.wait()
+        deadline = time.perf_counter() + duration_s
+        try:
+            while time.perf_counter() < deadline:
+                # context không zero_mode: địa chỉ Modbus n ứng với ô n+1 của datablock
+                rr = client.read_holding_registers(0, 29, slave=1)
+                if rr.isError() or rr.registers[0x02 - 1] != 7:
+                    errors.append(str(rr))
+                    return
+                counts[i] += 1
+        finally:
+            client.close()
+
+    threads = [threading.Thread(target=_reader, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    time.sleep(0.2)
+    start.set()
+    for t in threads:
+        t.join()
+    server.stop_tcp()
+
+    total = sum(counts)
+    print(f"[TEST_MODBUS_TCP] {clients} client, {duration_s:.0f} s: {total / duration_s:.0f} reads/s")
+    assert not errors, errors[0]
+    assert total > 0
+
+
+def test_batch_robot_failures() -> None:
+    """
+    Bước batch gửi robot phải báo lỗi khi robot không trả lời (port control
+    không mở) hoặc trả ret_code khác 0, và stop_on_error phải dừng batch.
+    """
+    from batch import BatchRunner
+    from control import AsyncRobotAPI, RobotAPI
+
+    def _run(sim: SimRobot, steps: List[dict]) -> dict:
+        sim.start()
+        robot = RobotAPI("127.0.0.1")
+        robot.connect_all()
+        runner = BatchRunner(robot, AsyncRobotAPI(robot))
+        try:
+            return asyncio.run(runner.run(steps))
+        finally:
+            robot.connection.stop()
+            sim.stop()
+
+    steps = [{"op": "confirm"}, {"op": "lift", "height": 1}]
+    dead = _run(SimRobot("127.0.0.1", ports=(19204, 19206)), steps)
+    print(f"[TEST_BATCH] dead port: {dead['steps']}")
+    assert not dead["ok"] and not dead["steps"][0]["ok"]
+    assert len(dead["steps"]) == 1, "stop_on_error không dừng batch"
+
+    rejected = _run(SimRobot("127.0.0.1", SimConfig(error_rate=1.0)), steps)
+    print(f"[TEST_BATCH] ret_code: {rejected['steps']}")
+    assert not rejected["ok"] and "ret_code=40000" in rejected["steps"][0]["error"]
+
+    accepted = _run(SimRobot("127.0.0.1"), steps)
+    assert accepted["ok"], accepted
+
+
+def test_mission_navigation_rejected() -> None:
+    """Mission phải fail ngay ở bước navigation khi robot trả ret_code lỗi, không chờ wait_arrived."""
+    from batch import BatchRunner
+    from control import AsyncRobotAPI, RobotAPI
+    from mission import MissionEngine, MissionState
+
+    sim = SimRobot("127.0.0.1", SimConfig(error_rate=1.0))
+    sim.start()
+    robot = RobotAPI("127.0.0.1")
+    robot.connect_all()
+    async_robot = AsyncRobotAPI(robot)
+    engine = MissionEngine(robot, async_robot, BatchRunner(robot, async_robot))
+
+    async def _scenario():
+        mission = engine.start([{"op": "navigation", "data": {"id": "LM2"}}, {"op": "wait_arrived", "location": "LM2"}])
+        await asyncio.wait_for(mission.task, 5.0)
+        return mission
+
+    try:
+        t0 = time.perf_counter()
+        mission = asyncio.run(_scenario())
+        elapsed = time.perf_counter() - t0
+    finally:
+        robot.connection.stop()
+        sim.stop()
+
+    print(f"[TEST_MISSION] {mission.state} in {elapsed * 1000:.0f} ms: {mission.records[0].error}")
+    assert mission.state == MissionState.failed
+    assert mission.records[0].state == MissionState.failed
+    assert mission.records[1].state != MissionState.running
+
+
+def test_conditions() -> None:
+    """Parser điều kiện của POST /wait: cú pháp bị từ chối, giới hạn kích thước và lỗi đánh giá trả 400."""
+    import httpx
+
+    from conditions import ConditionError, compile_condition
+    from control import RobotAPI
+
+    robot = RobotAPI("127.0.0.1")
+    robot.update_status({"task_status": 4, "current_station": "LM2", "path": ["LM1", "LM2"]})
+
+    rejected = [
+        "__import__('os')",                  # Call
+        "lambda: 1",                         # Lambda
+        "task_status.__class__",             # Attribute ngoài Dir/Color/Stopper
+        "[x for x in path]",                 # ListComp
+        "task_status ** 2",                  # Pow
+        "hr",                                # hr thiếu chỉ số
+        "hr[task_status]",                   # chỉ số hr không phải hằng
+        "Dir._secret",
+        "",
+        "1 == 1 or " * 60 + "True",          # quá MAX_CONDITION_LENGTH
+    ]
+    for expr in rejected:
+        try:
+            compile_condition(expr, robot)
+        except ConditionError:
+            continue
+        raise AssertionError(f"không từ chối: {expr!r}")
+
+    oversized = ["[0]*99999*99999*99 == 1", "'a'*999999999 == 'a'", "path + path == []", "-path == 1"]
+    for expr in oversized:
+        predicate, _ = compile_condition(expr, robot)
+        try:
+            predicate()
+        except ConditionError:
+            continue
+        raise AssertionError(f"không chặn số học trên chuỗi/list: {expr!r}")
+
+    accepted = {
+        'task_status == 4 and current_station == "LM2"': True,
+        "task_status * 2 + 1 == 9": True,
+        "missing_field + 1 == 2": False,
+        '"LM1" in path': True,
+    }
+    for expr, expected in accepted.items():
+        predicate, _ = compile_condition(expr, robot)
+        assert predicate() is expected, expr
+
+    import app as app_module
+
+    async def _post(condition: str) -> int:
+        transport = httpx.ASGITransport(app=app_module.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://amr") as client:
+            response = await client.post("/wait", json={"condition": condition, "timeout": 0.1})
+            return response.status_code
+
+    for expr in ("[0]*99999*99999*99 == 1", "__import__('os')"):
+        status = asyncio.run(_post(expr))
+        print(f"[TEST_CONDITIONS] POST /wait {expr!r}: {status}")
+        assert status == 400
+
+
+def test_station_index_off_map() -> None:
+    """nearest() với điểm hỏi ở xa ngoài bản đồ phải trả lời ngay và đúng như quét tuyến tính."""
+    import math
+    import random
+
+    from stations import Station, StationIndex
+
+    stations = [Station(f"LM{i}", random.uniform(0, 50), random.uniform(0, 50)) for i in range(200)]
+    index = StationIndex(stations)
+    for x, y in ((1e5, 0.0), (-1e5, -1e5), (25.0, 1e6), (10.0, 10.0), (-3.0, 60.0)):
+        t0 = time.perf_counter()
+        station, dist = index.nearest(x, y)
+        elapsed = time.perf_counter() - t0
+        expected = min(math.hypot(s.x - x, s.y - y) for s in stations)
+        print(f"[TEST_STATIONS] nearest({x:g}, {y:g}) = {station.id} {dist:.2f} m in {elapsed * 1000:.2f} ms")
+        assert abs(dist - expected) < 1e-9
+        assert elapsed < 0.1
+
+
 if __name__ == "__main__":
     # Chạy test interactive gửi DO
     # test_server_client_do_message()
+    # test_status_latency_during_slow_navigation()
+    # test_modbus_tcp_reads_per_second()
+    # test_station_index_off_map()
+    # test_conditions()
+    # test_batch_robot_failures()
+    # test_mission_navigation_rejected()
     test_get_client_id()
\ No newline at end of file
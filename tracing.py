@@ -0,0 +1,225 @@
+import asyncio
+import contextvars
+import functools
+import itertools
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+JsonDict = Dict[str, Any]
+
+TRACE_HEADER = b"x-trace"
+
+
+class Trace:
+    """
+    Một request được lấy mẫu: danh sách span phẳng (tên, thời điểm, thuộc tính).
+
+    Span có thể được thêm từ thread khác (thread gửi/đọc của RobotChannel);
+    list.append là nguyên tử dưới GIL nên không cần khóa.
+    """
+
+    __slots__ = ("trace_id", "name", "started", "started_at_ms", "ended", "spans", "attrs")
+
+    def __init__(self, trace_id: str, name: str, attrs: Optional[JsonDict] = None) -> None:
+        self.trace_id = trace_id
+        self.name = name
+        self.started = time.perf_counter()
+        self.started_at_ms = int(time.time() * 1000)
+        self.ended: Optional[float] = None
+        self.spans: List[tuple] = []
+        self.attrs = attrs or {}
+
+    def add(self, name: str, start: float, end: float, attrs: Optional[JsonDict] = None) -> None:
+        """Thêm span với start/end theo time.perf_counter()."""
+        self.spans.append((name, start, end, attrs))
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.ended if self.ended is not None else time.perf_counter()
+        return (end - self.started) * 1000
+
+    def as_dict(self) -> JsonDict:
+        return {
+            "id": self.trace_id,
+            "name": self.name,
+            "started_at_ms": self.started_at_ms,
+            "duration_ms": self.duration_ms,
+            "attrs": self.attrs,
+            "spans": [
+                {
+                    "name": name,
+                    "start_ms": (start - self.started) * 1000,
+                    "duration_ms": (end - start) * 1000,
+                    "attrs": attrs or {},
+                }
+                for name, start, end, attrs in sorted(self.spans, key=lambda s: s[1])
+            ],
+        }
+
+
+_current: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("trace", default=None)
+
+
+def current() -> Optional[Trace]:
+    return _current.get()
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc: Any) -> None:
+        return None
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("trace", "name", "attrs", "start")
+
+    def __init__(self, trace: Trace, name: str, attrs: Optional[JsonDict]) -> None:
+        self.trace = trace
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self) -> "_Span":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, *exc: Any) -> None:
+        attrs = self.attrs
+        if exc_type is not None:
+            attrs = dict(attrs or {}, error=exc_type.__name__)
+        self.trace.add(self.name, self.start, time.perf_counter(), attrs)
+
+
+def span(name: str, attrs: Optional[JsonDict] = None):
+    """Context manager đo một span trong trace hiện tại; không làm gì nếu request không được lấy mẫu."""
+    trace = _current.get()
+    if trace is None:
+        return _NULL_SPAN
+    return _Span(trace, name, attrs)
+
+
+class Tracer:
+    """
+    Lấy mẫu request theo sample_rate và giữ các trace đã xong trong ring buffer.
+
+    Request không được lấy mẫu chỉ tốn một lần random() và một
+    ContextVar.get() ở mỗi điểm đo. Header "X-Trace: 1" ép lấy mẫu request đó.
+    """
+
+    def __init__(self, sample_rate: float = 0.01, capacity: int = 256) -> None:
+        self.sample_rate = sample_rate
+        self.finished: Deque[Trace] = deque(maxlen=capacity)
+        self._ids = itertools.count(1)
+        self._prefix = f"{random.getrandbits(32):08x}"
+        self._lock = threading.Lock()
+        self.sampled = 0
+
+    def start(self, name: str, attrs: Optional[JsonDict] = None, force: bool = False) -> Optional[Trace]:
+        if not force and (self.sample_rate <= 0 or random.random() >= self.sample_rate):
+            return None
+        self.sampled += 1
+        return Trace(f"{self._prefix}-{next(self._ids)}", name, attrs)
+
+    def finish(self, trace: Trace) -> None:
+        trace.ended = time.perf_counter()
+        with self._lock:
+            self.finished.append(trace)
+
+    def query(self, limit: int = 50, min_ms: float = 0.0, name: str = "") -> List[JsonDict]:
+        with self._lock:
+            traces = list(self.finished)
+        found = [
+            t for t in reversed(traces)
+            if t.duration_ms >= min_ms and (not name or name in t.name)
+        ]
+        return [t.as_dict() for t in found[:limit]]
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware: mở trace cho request HTTP được lấy mẫu, đo span "http"
+    bao cả parse body lẫn gửi response, và trả id trace qua header X-Trace-Id.
+    """
+
+    def __init__(self, app, tracer: Tracer) -> None:
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        force = any(k == TRACE_HEADER and v not in (b"", b"0") for k, v in scope.get("headers", ()))
+        trace = self.tracer.start(f"{scope['method']} {scope['path']}", force=force)
+        if trace is None:
+            await self.app(scope, receive, send)
+            return
+
+        status: List[int] = []
+
+        async def send_traced(message) -> None:
+            if message["type"] == "http.response.start":
+                status.append(message["status"])
+                headers = list(message.get("headers", ()))
+                headers.append((b"x-trace-id", trace.trace_id.encode("ascii")))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        token = _current.set(trace)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_traced)
+        finally:
+            _current.reset(token)
+            trace.attrs["status"] = status[0] if status else 500
+            trace.add("http", start, time.perf_counter())
+            self.tracer.finish(trace)
+
+
+try:
+    from fastapi.routing import APIRoute
+except ImportError:
+    APIRoute = None
+
+if APIRoute is not None:
+
+    class TracedRoute(APIRoute):
+        """
+        Route FastAPI thêm span "route" (parse tham số + endpoint + serialize
+        response) và span "handler" (chỉ hàm endpoint).
+        """
+
+        def get_route_handler(self):
+            call = self.dependant.call
+            attrs = {"endpoint": self.name}
+            if asyncio.iscoroutinefunction(call):
+
+                @functools.wraps(call)
+                async def traced_call(*args, **kwargs):
+                    with span("handler", attrs):
+                        return await call(*args, **kwargs)
+
+            else:
+
+                @functools.wraps(call)
+                def traced_call(*args, **kwargs):
+                    with span("handler", attrs):
+                        return call(*args, **kwargs)
+
+            self.dependant.call = traced_call
+            handler = super().get_route_handler()
+
+            async def traced_handler(request):
+                with span("route", attrs):
+                    return await handler(request)
+
+            return traced_handler
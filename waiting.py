@@ -0,0 +1,43 @@
+import asyncio
+import time
+from typing import Callable
+
+from snapshot import StatusStore
+
+
+async def wait_until(
+    store: StatusStore,
+    predicate: Callable[[], bool],
+    timeout_s: float,
+    *,
+    registers=None,
+) -> bool:
+    """
+    Chờ tới khi predicate() đúng hoặc hết timeout_s; trả về predicate() cuối.
+
+    predicate được kiểm tra lại mỗi khi có snapshot status mới. Nếu điều kiện
+    có đọc thanh ghi Modbus thì truyền registers (ChangeNotifier của
+    modbus_server) để kiểm tra lại cả khi có ghi thanh ghi thay đổi giá trị.
+    """
+    deadline = time.monotonic() + timeout_s
+    version = store.current().version
+    reg_version = registers.version if registers is not None else 0
+    while True:
+        if predicate():
+            return True
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        if registers is None:
+            snapshot = await store.wait_async(version, remaining)
+            version = snapshot.version
+            continue
+        status_wait = asyncio.ensure_future(store.wait_async(version, remaining))
+        register_wait = asyncio.ensure_future(registers.wait_async(reg_version, remaining))
+        try:
+            await asyncio.wait((status_wait, register_wait), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            status_wait.cancel()
+            register_wait.cancel()
+        version = store.current().version
+        reg_version = registers.version